@@ -1,37 +1,82 @@
 # app/auth.py
-from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from jwt import InvalidTokenError as JWTError
+import bcrypt
+import jwt
 from sqlalchemy.orm import Session
-from pydantic import BaseModel, EmailStr, field_validator
+from pydantic import BaseModel, field_validator
+from cachetools import TTLCache
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+from datetime import datetime
+import hashlib
+import logging
+import os
+import random
+import secrets
+import threading
 import time
 
 from . import models
 from .dependencies import get_db
 from .settings import settings
-from .email_validator import validate_email  
+from .email_validator import normalize_email, validate_email
 
 router = APIRouter(prefix="/auth", tags=["auth"])
+# Endpoints de diagnóstico: main.py solo los monta con settings.DEBUG
+debug_router = APIRouter(prefix="/auth", tags=["debug"])
+logger = logging.getLogger(__name__)
 
 # ═══════════════════════════════════════════════════════════════════════
-# OPTIMIZACIÓN: Configurar bcrypt con rounds ajustables
+# OPTIMIZACIÓN: bcrypt directo con rounds ajustables (sin capa passlib)
 # ═══════════════════════════════════════════════════════════════════════
-pwd_ctx = CryptContext(
-    schemes=["bcrypt"],
-    deprecated="auto",
-    bcrypt__rounds=settings.BCRYPT_ROUNDS
+
+# Hash ficticio: login/registro pagan el mismo costo de bcrypt exista o no
+# el usuario (evita enumerar correos midiendo el tiempo de respuesta).
+# Calcularlo al importar también precarga bcrypt antes del primer login.
+_DUMMY_HASH = bcrypt.hashpw(
+    b"dummy", bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)
+).decode()
+
+# Pool dedicado para bcrypt (CPU-bound): limita el trabajo paralelo al número
+# de núcleos y deja libre el threadpool de FastAPI para BD/JSON
+_bcrypt_pool = ThreadPoolExecutor(
+    max_workers=os.cpu_count() or 1, thread_name_prefix="bcrypt"
 )
 
+# Decodificador PyJWT reutilizable (algoritmo fijo, sin resolverlo por token)
+_JWT_DECODER = jwt.PyJWT()
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+# ═══════════════════════════════════════════════════════════════════════
+# OPTIMIZACIÓN: Caché de tokens ya verificados
+# Evita jwt.decode + query a BD en cada request autenticado.
+# Clave: sha256 del token (no se guarda el token en claro).
+# ═══════════════════════════════════════════════════════════════════════
+_token_cache = TTLCache(
+    maxsize=settings.AUTH_CACHE_MAX_ENTRIES,
+    ttl=settings.AUTH_CACHE_TTL_SECONDS,
+)
+_token_cache_lock = threading.Lock()
+
 
 class UserCreate(BaseModel):
-    email: EmailStr
+    email: str
     password: str
     name: str | None = None
     
+    @field_validator('email')
+    @classmethod
+    def validate_email_format(cls, v):
+        """Validación de email (única pasada, reglas de app/email_validator.py)"""
+        is_valid, error = validate_email(v)
+        if not is_valid:
+            raise ValueError(f'Email inválido: {error}')
+        return normalize_email(v)
+    
     @field_validator('password')
     @classmethod
     def validate_password_strength(cls, v):
@@ -45,7 +90,7 @@ class UserCreate(BaseModel):
 
 class UserOut(BaseModel):
     id: int
-    email: EmailStr
+    email: str
     name: str | None
     class Config: 
         from_attributes = True
@@ -56,42 +101,122 @@ class Token(BaseModel):
     token_type: str = "bearer"
 
 
+def _timing_start() -> int:
+    """
+    Inicio de medición muestreada: perf_counter_ns() para una fracción
+    AUTH_TIMING_SAMPLE_RATE de las llamadas con DEBUG activo, 0 si no se mide
+    """
+    if (
+        random.random() < settings.AUTH_TIMING_SAMPLE_RATE
+        and logger.isEnabledFor(logging.DEBUG)
+    ):
+        return time.perf_counter_ns()
+    return 0
+
+
+def _elapsed_ms(start: int) -> float:
+    return (time.perf_counter_ns() - start) / 1e6
+
+
 def get_password_hash(p: str) -> str:
-    """Hash de contraseña con timing"""
-    start = time.time()
-    hashed = pwd_ctx.hash(p)
-    elapsed = (time.time() - start) * 1000
-    print(f"[AUTH] Hash generado en {elapsed:.0f}ms (rounds={settings.BCRYPT_ROUNDS})")
+    """Hash de contraseña con bcrypt"""
+    start = _timing_start()
+    hashed = bcrypt.hashpw(
+        p.encode(), bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)
+    ).decode()
+    if start:
+        logger.debug(
+            "Hash generado en %.1fms (rounds=%d)",
+            _elapsed_ms(start), settings.BCRYPT_ROUNDS,
+        )
     return hashed
 
 
 def verify_password(p: str, h: str) -> bool:
     """
-    Verificación de contraseña con timing y manejo de errores
+    Verificación de contraseña (checkpw compara en tiempo constante)
     """
-    start = time.time()
+    start = _timing_start()
     try:
-        result = pwd_ctx.verify(p, h)
-        elapsed = (time.time() - start) * 1000
-        print(f"[AUTH] Verificación en {elapsed:.0f}ms")
-        return result
+        result = bcrypt.checkpw(p.encode(), h.encode())
     except Exception as e:
         # Si falla la verificación (hash antiguo, corrupto, o inválido)
-        elapsed = (time.time() - start) * 1000
-        print(f"[AUTH] ❌ Error al verificar hash en {elapsed:.0f}ms: {type(e).__name__}")
+        logger.warning("Error al verificar hash: %s", type(e).__name__)
         return False
+    if start:
+        logger.debug("Verificación en %.1fms", _elapsed_ms(start))
+    return result
+
+
+async def _run_bcrypt(fn, *args):
+    """Ejecuta una función bcrypt en el pool dedicado sin bloquear el loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_bcrypt_pool, fn, *args)
+
+
+# Vida por defecto del token en segundos (exp se emite como epoch entero)
+_DEFAULT_TTL = settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
 
 
 def create_access_token(data: dict, minutes: int = None):
     """Crea token JWT"""
-    if minutes is None:
-        minutes = settings.ACCESS_TOKEN_EXPIRE_MINUTES
+    ttl = _DEFAULT_TTL if minutes is None else minutes * 60
     
     to_encode = data.copy()
-    to_encode["exp"] = datetime.utcnow() + timedelta(minutes=minutes)
+    to_encode["exp"] = int(time.time()) + ttl
+    # jti aleatorio: dos logins en el mismo segundo no comparten token
+    # (revocar uno con /auth/logout no revoca el otro)
+    to_encode["jti"] = secrets.token_hex(8)
     return jwt.encode(to_encode, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
 
 
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _verify_and_cache(token: str, db: Session):
+    """
+    Verifica el token y devuelve (payload, user_id, user_email, user_name).
+    Devuelve None si el token o el usuario no son válidos.
+    """
+    key = _token_key(token)
+    with _token_cache_lock:
+        cached = _token_cache.get(key)
+    if cached is not None and cached[0].get("exp", 0) > time.time():
+        return cached
+
+    try:
+        payload = _JWT_DECODER.decode(
+            token,
+            settings.JWT_SECRET,
+            algorithms=[settings.JWT_ALGORITHM],
+            options={"require": ["exp", "sub"]},
+        )
+    except JWTError as e:
+        logger.debug("Token rechazado: %s", e)
+        return None
+
+    # sub = id del usuario (tokens antiguos con email en sub se rechazan)
+    try:
+        user_id = int(payload["sub"])
+    except (TypeError, ValueError):
+        return None
+
+    # Token cerrado con /auth/logout (solo en MISS: el HIT ya pasó por aquí)
+    if db.get(models.RevokedToken, key) is not None:
+        return None
+
+    # Búsqueda por clave primaria (usa el identity map de la sesión)
+    user = db.get(models.User, user_id)
+    if not user:
+        return None
+
+    entry = (payload, user.id, user.email, user.name)
+    with _token_cache_lock:
+        _token_cache[key] = entry
+    return entry
+
+
 def get_current_user(
     db: Session = Depends(get_db), 
     token: str = Depends(oauth2_scheme)
@@ -103,140 +228,139 @@ def get_current_user(
         headers={"WWW-Authenticate": "Bearer"}
     )
     
-    try:
-        payload = jwt.decode(
-            token, 
-            settings.JWT_SECRET, 
-            algorithms=[settings.JWT_ALGORITHM]
-        )
-        email: str = payload.get("sub")
-        if not email: 
-            raise cred_exc
-    except JWTError as e:
-        print(f"[AUTH] Error JWT: {e}")
-        raise cred_exc
-    
-    user = db.query(models.User).filter(
-        models.User.email == email
-    ).first()
-    
-    if not user: 
+    entry = _verify_and_cache(token, db)
+    if entry is None:
         raise cred_exc
     
+    # Usuario ligero (no ligado a la sesión): las rutas solo usan id/email/name
+    _, user_id, user_email, user_name = entry
+    return models.User(id=user_id, email=user_email, name=user_name)
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# Acceso a BD de register/login: Session es síncrona, así que estas
+# funciones se ejecutan con run_in_threadpool para no bloquear el event loop
+# ═══════════════════════════════════════════════════════════════════════
+
+def _email_exists(db: Session, email: str) -> bool:
+    # EXISTS: solo se necesita un booleano, no hidratar el objeto User
+    return db.query(
+        db.query(models.User).filter(models.User.email == email).exists()
+    ).scalar()
+
+
+def _create_user(db: Session, email: str, password_hash: str, name: str) -> models.User:
+    user = models.User(email=email, password_hash=password_hash, name=name)
+    db.add(user)
+    db.commit()
+    db.refresh(user)
     return user
 
 
+def _find_user(db: Session, email: str):
+    return db.query(models.User).filter(models.User.email == email).first()
+
+
 @router.post("/register", response_model=Token)
-def register(user_in: UserCreate, db: Session = Depends(get_db)):
+async def register(user_in: UserCreate, db: Session = Depends(get_db)):
     """ OPTIMIZADO: Registro de usuario con validación de email"""
-    total_start = time.time()
-    
-    # Normalizar email
-    normalized_email = user_in.email.strip().lower()
-    print(f"[AUTH] Registrando usuario: {normalized_email}")
+    # Email ya validado y normalizado por UserCreate
+    normalized_email = user_in.email
     
-    # VALIDACIÓN DE EMAIL (AGREGADA)
-    is_valid_email, email_error = validate_email(normalized_email)
-    if not is_valid_email:
-        print(f"[AUTH] ❌ Email rechazado: {email_error}")
-        raise HTTPException(
-            status_code=400,
-            detail=f"Email inválido: {email_error}"
-        )
-    
-    # Verificar existencia
-    check_start = time.time()
-    existing_user = db.query(models.User).filter(
-        models.User.email == normalized_email
-    ).first()
-    check_time = (time.time() - check_start) * 1000
-    print(f"[AUTH] Verificación de email en {check_time:.0f}ms")
+    # Verificar existencia (consulta síncrona fuera del event loop)
+    existing_user = await run_in_threadpool(_email_exists, db, normalized_email)
     
     if existing_user:
+        await _run_bcrypt(verify_password, user_in.password, _DUMMY_HASH)
         raise HTTPException(
             status_code=400, 
             detail="Este correo ya está registrado"
         )
     
     # Hash de contraseña
-    password_hash = get_password_hash(user_in.password)
+    password_hash = await _run_bcrypt(get_password_hash, user_in.password)
     
-    # Crear usuario
-    user = models.User(
-        email=normalized_email,
-        password_hash=password_hash,
-        name=user_in.name
+    # Crear y guardar usuario (commit síncrono fuera del event loop)
+    user = await run_in_threadpool(
+        _create_user, db, normalized_email, password_hash, user_in.name
     )
     
-    # Guardar en BD
-    db_start = time.time()
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    db_time = (time.time() - db_start) * 1000
-    print(f"[AUTH] Guardado en BD en {db_time:.0f}ms")
-    
     # Generar token
-    token = create_access_token({"sub": user.email})
-    
-    total_time = (time.time() - total_start) * 1000
-    print(f"[AUTH] ✓ Registro completo en {total_time:.0f}ms")
+    token = create_access_token({"sub": str(user.id), "email": user.email})
     
     return {"access_token": token, "token_type": "bearer"}
 
 
 @router.post("/login", response_model=Token)
-def login(
+async def login(
     form: OAuth2PasswordRequestForm = Depends(), 
     db: Session = Depends(get_db)
 ):
     """ OPTIMIZADO: Inicio de sesión con validación de email"""
-    total_start = time.time()
-    
     # Normalizar email
     normalized_email = form.username.strip().lower()
-    print(f"[AUTH] Login: {normalized_email}")
     
     #  VALIDACIÓN DE EMAIL (AGREGADA)
     is_valid_email, email_error = validate_email(normalized_email)
     if not is_valid_email:
         # Mensaje genérico por seguridad (no revelar si es email o password)
-        print(f"[AUTH] ❌ Email inválido rechazado en login: {email_error}")
+        logger.debug("Login con email rechazado: %s", email_error)
         raise HTTPException(
             status_code=401, 
             detail="Correo o contraseña incorrectos"
         )
     
     # Buscar usuario
-    query_start = time.time()
-    user = db.query(models.User).filter(
-        models.User.email == normalized_email
-    ).first()
-    query_time = (time.time() - query_start) * 1000
-    print(f"[AUTH] Query usuario en {query_time:.0f}ms")
+    user = await run_in_threadpool(_find_user, db, normalized_email)
     
-    if not user:
-        raise HTTPException(
-            status_code=401, 
-            detail="Correo o contraseña incorrectos"
-        )
-    
-    # Verificar contraseña
-    if not verify_password(form.password, user.password_hash):
+    # Verificar contraseña (bcrypt se ejecuta siempre, exista o no el usuario)
+    password_ok = await _run_bcrypt(
+        verify_password, form.password, user.password_hash if user else _DUMMY_HASH
+    )
+    if user is None or not password_ok:
         raise HTTPException(
             status_code=401, 
             detail="Correo o contraseña incorrectos"
         )
     
     # Generar token
-    token = create_access_token({"sub": user.email})
-    
-    total_time = (time.time() - total_start) * 1000
-    print(f"[AUTH] ✓ Login completo en {total_time:.0f}ms")
+    token = create_access_token({"sub": str(user.id), "email": user.email})
     
     return {"access_token": token, "token_type": "bearer"}
 
 
+@router.post("/logout")
+def logout(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    """
+    Revoca el token hasta su exp (tabla revoked_tokens, compartida por los
+    workers). Otros workers pueden seguir aceptándolo mientras dure su
+    caché de verificación (AUTH_CACHE_TTL_SECONDS)
+    """
+    key = _token_key(token)
+    with _token_cache_lock:
+        _token_cache.pop(key, None)
+    
+    try:
+        payload = _JWT_DECODER.decode(
+            token,
+            settings.JWT_SECRET,
+            algorithms=[settings.JWT_ALGORITHM],
+            options={"require": ["exp"]},
+        )
+    except JWTError:
+        # Inválido o vencido: ya no autentica, no hay nada que revocar
+        return {"detail": "Sesión cerrada"}
+    
+    now = datetime.utcnow()
+    # Limpieza: las filas de tokens ya vencidos no hacen falta
+    db.query(models.RevokedToken).filter(models.RevokedToken.expires_at < now).delete()
+    db.merge(models.RevokedToken(
+        token_hash=key, expires_at=datetime.utcfromtimestamp(payload["exp"])
+    ))
+    db.commit()
+    return {"detail": "Sesión cerrada"}
+
+
 @router.get("/me", response_model=UserOut)
 def me(current: models.User = Depends(get_current_user)):
     """Obtiene información del usuario actual"""
@@ -244,27 +368,28 @@ def me(current: models.User = Depends(get_current_user)):
 
 
 # ═══════════════════════════════════════════════════════════════════════
-#  ENDPOINT DE DIAGNÓSTICO
+#  ENDPOINT DE DIAGNÓSTICO (solo con DEBUG=true)
 # ═══════════════════════════════════════════════════════════════════════
-@router.get("/performance-test")
-def performance_test():
-    """Prueba velocidad de hashing para diagnóstico"""
-    import time
-    
-    test_password = "test_password_123"
+# Resultado del benchmark por número de rounds (se calcula una sola vez)
+_BENCH_CACHE: dict = {}
+
+
+def _bench(rounds: int) -> dict:
+    """Mide hash + verificación bcrypt con los rounds indicados"""
+    test_password = b"test_password_123"
     
     # Test 1: Hash
-    start = time.time()
-    hash_result = pwd_ctx.hash(test_password)
-    hash_time = (time.time() - start) * 1000
+    start = time.perf_counter()
+    hash_result = bcrypt.hashpw(test_password, bcrypt.gensalt(rounds=rounds))
+    hash_time = (time.perf_counter() - start) * 1000
     
     # Test 2: Verify
-    start = time.time()
-    pwd_ctx.verify(test_password, hash_result)
-    verify_time = (time.time() - start) * 1000
+    start = time.perf_counter()
+    bcrypt.checkpw(test_password, hash_result)
+    verify_time = (time.perf_counter() - start) * 1000
     
     return {
-        "bcrypt_rounds": settings.BCRYPT_ROUNDS,
+        "bcrypt_rounds": rounds,
         "hash_time_ms": round(hash_time, 2),
         "verify_time_ms": round(verify_time, 2),
         "total_auth_time_ms": round(hash_time + verify_time, 2),
@@ -273,4 +398,13 @@ def performance_test():
             else "ACEPTABLE (100-300ms)" if (hash_time + verify_time) < 300
             else "LENTO (> 300ms) - Considera reducir BCRYPT_ROUNDS"
         )
-    }
\ No newline at end of file
+    }
+
+
+@debug_router.get("/performance-test")
+async def performance_test():
+    """Prueba velocidad de hashing para diagnóstico (cacheado por rounds)"""
+    rounds = settings.BCRYPT_ROUNDS
+    if rounds not in _BENCH_CACHE:
+        _BENCH_CACHE[rounds] = await _run_bcrypt(_bench, rounds)
+    return _BENCH_CACHE[rounds]
@@ -0,0 +1,111 @@
+# app/batcher.py
+"""
+Cola de inferencia productor/consumidor
+
+Los endpoints (productores) dejan (imagen, confianza, future) en una cola
+asyncio y esperan su future. Un consumidor en segundo plano junta las
+peticiones que llegan dentro de BATCH_WINDOW_MS (hasta MAX_BATCH_SIZE),
+las pasa por YOLO en una sola llamada y reparte los resultados.
+
+Etapas solapadas:
+    cola → predicción (hilo "predict", un lote a la vez)
+         → dibujo/payload (_postprocess_pool, en paralelo)
+El consumidor no espera al dibujo: mientras se dibuja un lote, el
+siguiente ya se está prediciendo.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from typing import Any, Dict, Tuple
+
+from PIL import Image
+
+from .inference import submit_inference_batch
+from .settings import settings
+
+
+class InferenceBatcher:
+    """Agrupa peticiones concurrentes en lotes para model.predict"""
+
+    def __init__(self, submit_fn=submit_inference_batch, max_batch: int = None,
+                 window_ms: int = None):
+        # submit_fn(images, confidences, copy) -> [concurrent Future] por imagen
+        self._submit_fn = submit_fn
+        self.max_batch = max_batch or settings.MAX_BATCH_SIZE
+        self.window = (settings.BATCH_WINDOW_MS if window_ms is None else window_ms) / 1000
+        # Un solo hilo de predicción: el modelo procesa un lote a la vez
+        self._predict_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="predict")
+        self._loop = None
+        self._queue = None
+        self._task = None
+
+    def start(self):
+        """Arranca el consumidor en el event loop actual (idempotente)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._task is not None and not self._task.done():
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._task = loop.create_task(self._consume())
+        print(f"[BATCHER] Cola de inferencia activa (lote máx {self.max_batch}, "
+              f"ventana {self.window * 1000:.0f}ms)")
+
+    async def stop(self):
+        """Detiene el consumidor (las peticiones en curso terminan igual)"""
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+        self._task = None
+
+    async def submit(
+        self, image: Image.Image, confidence: float, copy: bool = True
+    ) -> Tuple[Image.Image, Dict[str, Any]]:
+        """Encola una imagen y espera su (imagen anotada, payload)"""
+        self.start()
+        fut = self._loop.create_future()
+        await self._queue.put((image, confidence, copy, fut))
+        # El consumidor resuelve `fut` con el Future del post-proceso
+        return await asyncio.wrap_future(await fut)
+
+    async def _consume(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            # Ventana corta para que se sumen peticiones concurrentes
+            if self.window > 0 and self._queue.qsize() < self.max_batch - 1:
+                await asyncio.sleep(self.window)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            # Confianzas distintas van en el mismo lote (submit_fn filtra
+            # cada resultado con la suya); solo se separa por `copy`
+            groups = {}
+            for image, confidence, copy, fut in batch:
+                groups.setdefault(copy, []).append((image, confidence, fut))
+
+            for copy, items in groups.items():
+                await self._dispatch(loop, copy, items)
+
+    async def _dispatch(self, loop, copy, items):
+        images = [image for image, _, _ in items]
+        confidences = [confidence for _, confidence, _ in items]
+        try:
+            results = await loop.run_in_executor(
+                self._predict_pool, self._submit_fn, images, confidences, copy
+            )
+        except Exception as e:
+            print(f"[BATCHER] ❌ Error en lote de {len(images)}: {e}")
+            for _, _, fut in items:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+
+        for (_, _, fut), result in zip(items, results):
+            if not fut.done():  # el cliente pudo desconectarse
+                fut.set_result(result)
+
+
+# Instancia compartida por los endpoints
+inference_batcher = InferenceBatcher()
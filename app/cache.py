@@ -5,106 +5,131 @@ Evita re-procesar la misma imagen múltiples veces
 """
 
 import hashlib
+import io
+import json
+import os
+import threading
 import time
-from typing import Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+from cachetools import TTLCache
 from PIL import Image
-import io
+from sqlalchemy import select
 
+from . import models
+from .database import SessionLocal
 from .settings import settings
 
+# hashlib libera el GIL con buffers grandes: varias imágenes se hashean en
+# paralelo real en este pool
+_hash_pool = ThreadPoolExecutor(
+    max_workers=os.cpu_count() or 1, thread_name_prefix="img-hash"
+)
+
+
+def _entry_size(entry: Dict[str, Any]) -> int:
+    """
+    Bytes de una entrada: los de la imagen anotada decodificada, que domina
+    sobre el payload. Otros resultados cuentan como 1
+    """
+    result = entry['result']
+    if isinstance(result, tuple) and isinstance(result[0], Image.Image):
+        img = result[0]
+        return img.width * img.height * len(img.getbands())
+    return 1
+
 
 class ResultCache:
     """
-    Caché simple en memoria para resultados de análisis
+    Caché en memoria para resultados de análisis.
+    TTLCache se encarga de la expiración y del desalojo LRU. El tamaño se
+    acota en bytes de imagen (CACHE_MAX_MB), no en entradas: cada resultado
+    retiene su radiografía anotada completa.
+    TTLCache no es thread-safe: todo acceso pasa por self._lock.
     """
     
     def __init__(self):
-        self.cache: Dict[str, Dict[str, Any]] = {}
         self.enabled = settings.ENABLE_RESULT_CACHE
         self.ttl = settings.CACHE_TTL_SECONDS
-        print(f"[CACHE] Inicializado (enabled={self.enabled}, TTL={self.ttl}s)")
-    
-    def _get_image_hash(self, img: Image.Image) -> str:
-        """
-        Genera hash único de una imagen
-        """
-        # Convertir imagen a bytes
-        buf = io.BytesIO()
-        img.save(buf, format='PNG')
-        img_bytes = buf.getvalue()
-        
-        # Calcular hash SHA256
-        return hashlib.sha256(img_bytes).hexdigest()
+        self.max_bytes = settings.CACHE_MAX_MB * 1024 * 1024
+        self.cache: TTLCache = TTLCache(
+            maxsize=self.max_bytes, ttl=self.ttl, getsizeof=_entry_size
+        )
+        self._lock = threading.Lock()
+        print(
+            f"[CACHE] Inicializado (enabled={self.enabled}, TTL={self.ttl}s, "
+            f"max={settings.CACHE_MAX_MB} MB)"
+        )
     
-    def get(self, img: Image.Image) -> Optional[Dict[str, Any]]:
+    def lookup(self, key: str) -> Optional[Any]:
         """
-        Obtiene resultado cacheado si existe y no ha expirado
+        Obtiene el resultado cacheado para la clave (ver inference_cache_key)
+        si existe y no ha expirado
         
         Returns:
-            Dict con resultado o None si no existe/expiró
+            Resultado o None si no existe/expiró
         """
         if not self.enabled:
             return None
         
-        img_hash = self._get_image_hash(img)
+        with self._lock:
+            entry = self.cache.get(key)
         
-        if img_hash in self.cache:
-            entry = self.cache[img_hash]
+        if entry is not None:
             age = time.time() - entry['timestamp']
-            
-            if age < self.ttl:
-                print(f"[CACHE] ✓ HIT (age={age:.1f}s, hash={img_hash[:8]}...)")
-                return entry['result']
-            else:
-                # Expirado, eliminar
-                print(f"[CACHE] × EXPIRED (age={age:.1f}s, hash={img_hash[:8]}...)")
-                del self.cache[img_hash]
+            print(f"[CACHE] ✓ HIT (age={age:.1f}s, hash={key[:8]}...)")
+            return entry['result']
         
-        print(f"[CACHE] × MISS (hash={img_hash[:8]}...)")
+        print(f"[CACHE] × MISS (hash={key[:8]}...)")
         return None
     
-    def set(self, img: Image.Image, result: Dict[str, Any]):
+    def lookup_many(self, keys: List[str]) -> List[Optional[Any]]:
         """
-        Guarda resultado en caché
+        Versión por lotes de lookup(): un solo lock para todo el lote
+        
+        Returns:
+            Lista (mismo orden que keys) con el resultado o None por clave
         """
         if not self.enabled:
-            return
-        
-        img_hash = self._get_image_hash(img)
+            return [None] * len(keys)
         
-        self.cache[img_hash] = {
-            'result': result,
-            'timestamp': time.time()
-        }
-        
-        print(f"[CACHE] ✓ STORED (hash={img_hash[:8]}..., entries={len(self.cache)})")
+        with self._lock:
+            entries = [self.cache.get(k) for k in keys]
         
-        # Limpieza automática si hay muchas entradas
-        if len(self.cache) > 100:
-            self._cleanup_old_entries()
+        hits = sum(e is not None for e in entries)
+        print(f"[CACHE] Lote: {hits} HIT / {len(entries) - hits} MISS")
+        return [e['result'] if e is not None else None for e in entries]
     
-    def _cleanup_old_entries(self):
+    def store(self, key: str, result: Any):
         """
-        Elimina entradas antiguas del caché
+        Guarda el resultado bajo la clave (ver inference_cache_key)
         """
-        now = time.time()
-        old_keys = [
-            k for k, v in self.cache.items()
-            if now - v['timestamp'] > self.ttl
-        ]
+        if not self.enabled:
+            return
         
-        for key in old_keys:
-            del self.cache[key]
+        entry = {'result': result, 'timestamp': time.time()}
+        if _entry_size(entry) > self.max_bytes:
+            # TTLCache rechaza (ValueError) un valor mayor que todo el caché
+            print(f"[CACHE] × Demasiado grande para el caché (hash={key[:8]}...)")
+            return
+        
+        with self._lock:
+            self.cache[key] = entry
+            entries = len(self.cache)
+            used_mb = self.cache.currsize / (1024 * 1024)
         
-        if old_keys:
-            print(f"[CACHE] Limpieza: {len(old_keys)} entradas eliminadas")
+        print(
+            f"[CACHE] ✓ STORED (hash={key[:8]}..., entries={entries}, "
+            f"{used_mb:.0f} MB)"
+        )
     
     def clear(self):
         """
         Limpia todo el caché
         """
-        count = len(self.cache)
-        self.cache.clear()
+        with self._lock:
+            count = len(self.cache)
+            self.cache.clear()
         print(f"[CACHE] Cache limpiado ({count} entradas)")
     
     def stats(self) -> Dict[str, Any]:
@@ -112,11 +137,15 @@ class ResultCache:
         Estadísticas del caché
         """
         now = time.time()
-        ages = [now - v['timestamp'] for v in self.cache.values()]
+        with self._lock:
+            ages = [now - v['timestamp'] for v in self.cache.values()]
+            used_bytes = self.cache.currsize
         
         return {
             "enabled": self.enabled,
-            "entries": len(self.cache),
+            "entries": len(ages),
+            "bytes": used_bytes,
+            "max_bytes": self.max_bytes,
             "ttl_seconds": self.ttl,
             "oldest_entry_age": max(ages) if ages else 0,
             "newest_entry_age": min(ages) if ages else 0,
@@ -125,13 +154,98 @@ class ResultCache:
 
 # Instancia global del caché
 _result_cache = None
+_result_cache_lock = threading.Lock()
 
 
 def get_cache() -> ResultCache:
     """
-    Obtiene instancia singleton del caché
+    Obtiene instancia singleton del caché (thread-safe: los endpoints
+    síncronos corren en el threadpool y podían crear dos instancias)
     """
     global _result_cache
     if _result_cache is None:
-        _result_cache = ResultCache()
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = ResultCache()
     return _result_cache
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# Caché persistente de inferencias (SQLite)
+# Re-subir el mismo estudio evita la pasada de YOLO y el dibujo, también
+# después de reiniciar el servicio. Nunca interrumpe el análisis: un
+# error de BD se registra y se trata como MISS.
+# ═══════════════════════════════════════════════════════════════════════
+
+def inference_cache_key(img: Image.Image, confidence: float, model_tag: str) -> str:
+    """
+    Clave de la inferencia: blake2b (deduplicación, no criptografía) de los
+    píxeles, su modo/tamaño, la confianza y el modelo
+    """
+    h = hashlib.blake2b(
+        f"{img.mode}:{img.size}:{confidence!r}:{model_tag}".encode(), digest_size=16
+    )
+    h.update(memoryview(img.tobytes()))
+    return h.hexdigest()
+
+
+def inference_cache_keys(
+    imgs: List[Image.Image], confidences: List[float], model_tag: str
+) -> List[str]:
+    """Claves de un lote, calculadas en paralelo en _hash_pool (mismo orden)"""
+    if len(imgs) == 1:
+        return [inference_cache_key(imgs[0], confidences[0], model_tag)]
+    return list(_hash_pool.map(
+        lambda args: inference_cache_key(*args, model_tag), zip(imgs, confidences)
+    ))
+
+
+def load_inference(key: str) -> Optional[Tuple[Image.Image, Dict[str, Any]]]:
+    """Devuelve (imagen anotada, payload) guardados para la clave, o None"""
+    try:
+        with SessionLocal() as db:
+            row = db.get(models.InferenceCache, key)
+            if row is None:
+                return None
+            img = Image.open(io.BytesIO(row.image_png))
+            img.load()
+            return img, json.loads(row.payload_json)
+    except Exception as e:
+        print(f"[CACHE] ⚠️ Error leyendo caché de inferencias: {e}")
+        return None
+
+
+# Escrituras de la caché persistente fuera del camino de la petición:
+# un solo hilo (SQLite admite un escritor a la vez)
+_store_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-store")
+
+
+def submit_store_inference(key: str, img: Image.Image, payload: Dict[str, Any]):
+    """Encola store_inference sin esperar (PNG + escritura en segundo plano)"""
+    _store_pool.submit(store_inference, key, img, dict(payload))
+
+
+def store_inference(key: str, img: Image.Image, payload: Dict[str, Any]):
+    """Guarda el resultado y desaloja las entradas más antiguas sobre el límite"""
+    buf = io.BytesIO()
+    img.save(buf, format="PNG", compress_level=1)  # sin pérdida y rápido
+    
+    try:
+        with SessionLocal() as db:
+            db.merge(models.InferenceCache(
+                key=key,
+                payload_json=json.dumps(payload, ensure_ascii=False),
+                image_png=buf.getvalue(),
+            ))
+            db.flush()
+            
+            Entry = models.InferenceCache
+            stale = (
+                select(Entry.key)
+                .order_by(Entry.created_at.desc())
+                .offset(settings.INFERENCE_CACHE_MAX_ENTRIES)
+            )
+            db.query(Entry).filter(Entry.key.in_(stale)).delete(synchronize_session=False)
+            db.commit()
+    except Exception as e:
+        print(f"[CACHE] ⚠️ Error guardando caché de inferencias: {e}")
@@ -5,7 +5,29 @@ Valida formato y estructura para evitar correos inválidos
 """
 
 import re
-from typing import Tuple
+import string
+from typing import Optional, Tuple
+
+# Caracteres permitidos en el usuario (letras, números, punto, guion, guion bajo)
+_USER_CHARS = frozenset(string.ascii_lowercase + string.digits + '._-')
+# Caracteres permitidos en cada parte del dominio y en la extensión
+_DOMAIN_CHARS = frozenset(string.ascii_lowercase + string.digits + '-')
+_ALPHA_SET = frozenset(string.ascii_lowercase)
+
+# Patrones compilados una sola vez al importar el módulo
+# Dominio completo válido en un solo match: partes alfanuméricas (guiones
+# solo en el interior) separadas por punto y extensión de 2+ letras
+_DOMAIN_PATTERN = (
+    r'[a-z0-9]([a-z0-9-]*[a-z0-9])?(\.[a-z0-9]([a-z0-9-]*[a-z0-9])?)*\.[a-z]{2,}'
+)
+_DOMAIN_RE = re.compile(_DOMAIN_PATTERN)
+# Correo completo válido en un solo match (todas las reglas de abajo):
+# usuario de 3+ caracteres permitidos con al menos 2 letras y sin puntos
+# al inicio/final ni consecutivos, seguido de un dominio válido
+_EMAIL_RE = re.compile(
+    r'(?=[a-z0-9._-]{3,}@)(?=(?:[^@a-z]*[a-z]){2})'
+    r'[a-z0-9_-]+(\.[a-z0-9_-]+)*@' + _DOMAIN_PATTERN
+)
 
 
 def validate_email(email: str) -> Tuple[bool, str]:
@@ -22,6 +44,10 @@ def validate_email(email: str) -> Tuple[bool, str]:
     
     email = email.strip().lower()
     
+    # Camino rápido: el caso común (correo válido) se resuelve con un match
+    if len(email) <= 320 and _EMAIL_RE.fullmatch(email):
+        return True, None
+    
     if '@' not in email:
         return False, "El correo debe contener un @"
     
@@ -39,71 +65,98 @@ def validate_email(email: str) -> Tuple[bool, str]:
     if len(user) < 3:
         return False, "El nombre de usuario debe tener al menos 3 caracteres"
     
-    # Caracteres permitidos (letras, números, punto, guion, guion bajo)
-    if not re.match(r'^[a-z0-9._-]+$', user):
-        return False, "El usuario contiene caracteres no permitidos"
+    # Una sola pasada: caracteres permitidos, puntos consecutivos y conteo
+    # de letras/dígitos (antes eran ~6 recorridos y 3 copias del string)
+    letters = digits = 0
+    consecutive_dots = False
+    prev_dot = False
+    for c in user:
+        if c not in _USER_CHARS:
+            return False, "El usuario contiene caracteres no permitidos"
+        if c == '.':
+            consecutive_dots = consecutive_dots or prev_dot
+            prev_dot = True
+            continue
+        prev_dot = False
+        if 'a' <= c <= 'z':
+            letters += 1
+        elif '0' <= c <= '9':
+            digits += 1
     
     # No puede empezar/terminar con punto
     if user[0] == '.' or user[-1] == '.':
         return False, "El usuario no puede empezar o terminar con punto"
     
     # No puede tener puntos consecutivos
-    if '..' in user:
+    if consecutive_dots:
         return False, "El correo no puede contener puntos consecutivos"
     
-    # No puede ser solo números (después de quitar ._-)
-    if user.replace('.', '').replace('_', '').replace('-', '').isdigit():
+    # No puede ser solo números (ignorando ._-)
+    if digits and not letters:
         return False, "El nombre de usuario no puede ser solo números"
     
     # Debe tener al menos 2 letras
-    if sum(1 for c in user if c.isalpha()) < 2:
+    if letters < 2:
         return False, "El nombre de usuario debe contener al menos 2 letras"
     
     # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
     # VALIDAR DOMINIO
     # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
     
+    # Camino rápido: dominio válido en un solo match
+    if not _DOMAIN_RE.fullmatch(domain):
+        # Camino lento: identificar el motivo exacto del rechazo
+        error = _domain_error(domain)
+        if error:
+            return False, error
+    
+    # Longitud total máxima
+    if len(email) > 320:
+        return False, "El correo es demasiado largo"
+    
+    # Correo válido
+    return True, None
+
+
+def _domain_error(domain: str) -> Optional[str]:
+    """Devuelve el motivo por el que el dominio es inválido (o None)."""
+    
     # Debe tener punto y no estar vacío
     if not domain or '.' not in domain:
-        return False, "El dominio debe tener una extensión válida"
-    
+        return "El dominio debe tener una extensión válida"
+
     # No puede tener puntos consecutivos
     if '..' in domain:
-        return False, "El dominio no puede contener puntos consecutivos"
-    
+        return "El dominio no puede contener puntos consecutivos"
+
     # No puede empezar/terminar con punto
     if domain[0] == '.' or domain[-1] == '.':
-        return False, "El dominio no puede empezar o terminar con punto"
-    
+        return "El dominio no puede empezar o terminar con punto"
+
     # Validar partes del dominio
     parts = domain.split('.')
-    
+
     if len(parts) < 2:
-        return False, "El dominio debe tener al menos un nombre y extensión"
-    
+        return "El dominio debe tener al menos un nombre y extensión"
+
     for part in parts:
         if not part:
-            return False, "El dominio contiene partes vacías"
+            return "El dominio contiene partes vacías"
         
         # Solo letras, números y guiones
-        if not re.match(r'^[a-z0-9-]+$', part):
-            return False, "El dominio contiene caracteres no permitidos"
+        if not _DOMAIN_CHARS.issuperset(part):
+            return "El dominio contiene caracteres no permitidos"
         
         # No puede empezar/terminar con guion
         if part[0] == '-' or part[-1] == '-':
-            return False, "Las partes del dominio no pueden empezar/terminar con guion"
-    
+            return "Las partes del dominio no pueden empezar/terminar con guion"
+
     # Extensión debe tener al menos 2 caracteres y solo letras
     extension = parts[-1]
-    if len(extension) < 2 or not extension.isalpha():
-        return False, "La extensión del dominio debe tener al menos 2 letras"
+    if len(extension) < 2 or not _ALPHA_SET.issuperset(extension):
+        return "La extensión del dominio debe tener al menos 2 letras"
     
-    # Longitud total máxima
-    if len(email) > 320:
-        return False, "El correo es demasiado largo"
-    
-    # Correo válido
-    return True, None
+    return None
 
 
 def normalize_email(email: str) -> str:
@@ -0,0 +1,42 @@
+# app/image_store.py
+"""
+Imágenes anotadas del historial fuera de la BD
+
+Cada análisis guardado escribe su JPEG en {IMAGE_DIR}/{user_id}/{analysis_id}.jpg
+y la fila solo guarda la clave relativa ("{user_id}/{analysis_id}.jpg").
+Así las filas de `analyses` quedan pequeñas y el listado no arrastra
+cientos de KB de base64 por análisis.
+"""
+
+import base64
+import os
+from pathlib import Path
+from typing import Optional
+
+from .settings import settings
+
+
+def image_key(user_id: int, analysis_id: int) -> str:
+    return f"{user_id}/{analysis_id}.jpg"
+
+
+def image_path(key: str) -> Path:
+    return Path(settings.IMAGE_DIR) / key
+
+
+def save_image_base64(user_id: int, analysis_id: int, image_b64: str) -> str:
+    """Escribe la imagen (base64 JPEG) en disco y devuelve su clave"""
+    key = image_key(user_id, analysis_id)
+    path = image_path(key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Escritura atómica: un lector nunca ve un archivo a medias
+    tmp = path.with_suffix(".tmp")
+    tmp.write_bytes(base64.b64decode(image_b64))
+    os.replace(tmp, path)
+    return key
+
+
+def delete_image(key: Optional[str]):
+    """Borra la imagen de un análisis (si existe)"""
+    if key:
+        image_path(key).unlink(missing_ok=True)
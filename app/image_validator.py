@@ -1,25 +1,38 @@
+import hashlib
 import io
+import math
+import threading
 from typing import Tuple, Optional, Dict
 import numpy as np
+from cachetools import LRUCache
 from PIL import Image
 
+from .settings import settings
+
 # ─────────────────────────────────────────────────────────────
 # 1. Validación básica de archivo
 # ─────────────────────────────────────────────────────────────
 
+# Lado máximo aceptado (px)
+MAX_IMAGE_SIDE = 10000
+
+# Extensiones como tuplas: str.endswith las recorre en C
+_VALID_EXT = (".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".tif")
+_VIDEO_EXT = (".mp4", ".avi", ".mov", ".wmv")
+
+
 def validate_image_file(file_bytes: bytes, filename: str) -> Tuple[bool, str, Optional[Image.Image]]:
     """Valida que el archivo sea una imagen válida (sin límite mínimo de tamaño)."""
 
-    valid_extensions = [".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".tif"]
     file_lower = filename.lower()
 
-    if not any(file_lower.endswith(ext) for ext in valid_extensions):
+    if not file_lower.endswith(_VALID_EXT):
         if file_lower.endswith(".pdf"):
             return False, (
                 "Archivo PDF detectado. Por favor exporta el PDF como imagen (JPG/PNG) "
                 "antes de subirlo."
             ), None
-        if any(file_lower.endswith(ext) for ext in [".mp4", ".avi", ".mov", ".wmv"]):
+        if file_lower.endswith(_VIDEO_EXT):
             return False, "Se detectó un archivo de video. Sube una imagen de radiografía.", None
         return False, (
             "Tipo de archivo no soportado. Solo se aceptan imágenes: "
@@ -33,14 +46,24 @@ def validate_image_file(file_bytes: bytes, filename: str) -> Tuple[bool, str, Op
         ), None
 
     try:
+        # Image.open solo lee la cabecera: los píxeles aún no se decodifican
         img = Image.open(io.BytesIO(file_bytes))
-        img = img.convert("RGB")
     except Exception:
         return False, "El archivo está corrupto o no es una imagen válida.", None
 
+    # Límite de tamaño antes de decodificar (una imagen enorme se rechaza
+    # sin reservar memoria para sus píxeles)
     width, height = img.size
-    if width > 10000 or height > 10000:
-        return False, f"La imagen es demasiado grande ({width}x{height}px). Máximo 10000x10000px.", None
+    if width > MAX_IMAGE_SIDE or height > MAX_IMAGE_SIDE:
+        return False, (
+            f"La imagen es demasiado grande ({width}x{height}px). "
+            f"Máximo {MAX_IMAGE_SIDE}x{MAX_IMAGE_SIDE}px."
+        ), None
+
+    try:
+        img = img.convert("RGB")
+    except Exception:
+        return False, "El archivo está corrupto o no es una imagen válida.", None
 
     return True, "", img
 
@@ -48,34 +71,74 @@ def validate_image_file(file_bytes: bytes, filename: str) -> Tuple[bool, str, Op
 # 2. ¿Parece radiografía? (HSV + umbrales ajustados)
 # ─────────────────────────────────────────────────────────────
 
+# Umbrales de la heurística (ajustables en un solo lugar)
+STRONG_COLOR_THRESHOLD = 0.35   # S de un píxel "muy colorido"
+MEDIUM_COLOR_THRESHOLD = 0.20   # S de un píxel "con color"
+MEAN_SAT_LIMIT = 0.10           # Criterio 1: saturación promedio máxima
+STRONG_RATIO_LIMIT = 0.10       # Criterio 2: fracción máxima de píxeles muy coloridos
+MEDIUM_MEAN_SAT_LIMIT = 0.05    # Criterio 3: saturación promedio...
+MEDIUM_RATIO_LIMIT = 0.40       # ...combinada con esta fracción de píxeles con color
+MEDIUM_RATIO_MAX = 0.45         # Criterio 4: fracción máxima de píxeles con color
+MIN_GRAY_STD = 12               # Contraste mínimo (desv. estándar en gris)
+DARK_LEVEL = 50                 # Gris < DARK_LEVEL → zona oscura
+BRIGHT_LEVEL = 200              # Gris > BRIGHT_LEVEL → zona clara
+COMIC_MID_RATIO_MAX = 0.25      # Dibujo: pocos tonos medios...
+COMIC_EXTREME_RATIO = 0.30      # ...y muchos oscuros o claros
+MIN_DARK_RATIO = 0.01
+MIN_BRIGHT_RATIO = 0.002
+PANORAMIC_ASPECT_RANGE = (1.4, 4.0)
+
+# Umbrales de saturación en enteros uint8: S/255 > T ⇔ S >= floor(T*255) + 1
+_S_STRONG_MIN = math.floor(STRONG_COLOR_THRESHOLD * 255) + 1
+_S_MEDIUM_MIN = math.floor(MEDIUM_COLOR_THRESHOLD * 255) + 1
+_LEVELS = np.arange(256, dtype=np.int64)
+
+# Lado máximo de la muestra sobre la que se calculan las estadísticas
+_STATS_MAX_SIDE = 512
+
+
+def _stats_sample(img: Image.Image) -> Image.Image:
+    """
+    Submuestra la imagen a _STATS_MAX_SIDE px de lado mayor.
+    Todas las métricas son proporciones/medias de la imagen completa, así que
+    una muestra de ~2.6e5 píxeles basta. Se usa NEAREST (no BILINEAR): promediar
+    píxeles reduciría la desviación estándar y las zonas muy oscuras/claras.
+    """
+    w, h = img.size
+    scale = max(w, h) / _STATS_MAX_SIDE
+    if scale <= 1:
+        return img
+    size = (max(1, round(w / scale)), max(1, round(h / scale)))
+    return img.resize(size, Image.NEAREST)
+
 def validate_is_xray(img: Image.Image) -> Tuple[bool, str, float]:
 
+    # Estadísticas sobre una muestra reducida (la imagen original no se toca)
+    img = _stats_sample(img)
 
-    # Convertimos a HSV para analizar saturación
+    # Convertimos a HSV para analizar saturación: PIL convierte en C y
+    # calcula el histograma del canal S sin materializar arrays en NumPy
     hsv = img.convert("HSV")
-    hsv_arr = np.array(hsv).astype(float)
-    s = hsv_arr[:, :, 1] / 255.0  # Saturación 0-1
-    v = hsv_arr[:, :, 2]
+    s_hist = np.asarray(hsv.getchannel("S").histogram(), dtype=np.int64)
 
-    total_pixels = float(s.size)
+    total_pixels = float(hsv.width * hsv.height)
 
     # ── 2.1 Calcular métricas de color ──
+    # Las métricas salen de sumas sobre los 256 bins del histograma
     
-    # Píxeles con color fuerte (S > 0.35)
-    strong_color_pixels = (s > 0.35).sum()
-    strong_color_ratio = strong_color_pixels / total_pixels
+    # Píxeles con color fuerte (S > STRONG_COLOR_THRESHOLD)
+    strong_color_ratio = s_hist[_S_STRONG_MIN:].sum() / total_pixels
     
-    # Píxeles con color medio (S > 0.20)
-    medium_color_pixels = (s > 0.20).sum()
-    medium_color_ratio = medium_color_pixels / total_pixels
+    # Píxeles con color medio (S > MEDIUM_COLOR_THRESHOLD)
+    medium_color_ratio = s_hist[_S_MEDIUM_MIN:].sum() / total_pixels
     
     # Saturación promedio
-    mean_saturation = float(s.mean())
+    mean_saturation = float(s_hist @ _LEVELS) / total_pixels / 255.0
 
     # ── 2.2 LÓGICA MULTI-CRITERIO (más estricta) ──
     
     # CRITERIO 1: Saturación promedio MUY alta → foto claramente a color
-    if mean_saturation > 0.10:
+    if mean_saturation > MEAN_SAT_LIMIT:
         return (
             False,
             f"La imagen tiene saturación muy alta ({mean_saturation*100:.1f}%). "
@@ -84,7 +147,7 @@ def validate_is_xray(img: Image.Image) -> Tuple[bool, str, float]:
         )
     
     # CRITERIO 2: Muchos píxeles MUY coloridos → foto con objetos de color
-    if strong_color_ratio > 0.10:
+    if strong_color_ratio > STRONG_RATIO_LIMIT:
         return (
             False,
             f"La imagen contiene muchos píxeles con colores fuertes ({strong_color_ratio*100:.1f}%). "
@@ -94,7 +157,7 @@ def validate_is_xray(img: Image.Image) -> Tuple[bool, str, float]:
     
     # CRITERIO 3: Saturación media + MUCHOS píxeles con color medio
     # (Esto detecta fotos pero tolera radiografías con leve tinte)
-    if mean_saturation > 0.05 and medium_color_ratio > 0.40:
+    if mean_saturation > MEDIUM_MEAN_SAT_LIMIT and medium_color_ratio > MEDIUM_RATIO_LIMIT:
         return (
             False,
             f"La imagen tiene saturación media ({mean_saturation*100:.1f}%) "
@@ -105,7 +168,7 @@ def validate_is_xray(img: Image.Image) -> Tuple[bool, str, float]:
 
     # CRITERIO 4: Saturación muy baja pero MUCHOS píxeles coloridos
     # (Detecta fotos con dominante gris pero accesorios coloridos)
-    if medium_color_ratio > 0.45:
+    if medium_color_ratio > MEDIUM_RATIO_MAX:
         return (
             False,
             f"La imagen tiene demasiados píxeles con color ({medium_color_ratio*100:.1f}%). "
@@ -114,20 +177,25 @@ def validate_is_xray(img: Image.Image) -> Tuple[bool, str, float]:
         )
 
     # ── 2.3 Contraste e intensidades en escala de grises ──
+    # Un histograma de 256 niveles (en C) da la desviación estándar y la
+    # distribución de intensidades sin copiar la imagen a un array float64
     gray = img.convert("L")
-    g_arr = np.array(gray).astype(float)
+    g_hist = np.asarray(gray.histogram(), dtype=np.int64)
+    g_total = float(gray.width * gray.height)
 
-    std = float(g_arr.std())
-    if std < 12:
+    g_mean = float(g_hist @ _LEVELS) / g_total
+    std = math.sqrt(float(g_hist @ (_LEVELS - g_mean) ** 2) / g_total)
+    if std < MIN_GRAY_STD:
         return False, "La imagen tiene muy poco contraste para ser una radiografía dental útil.", std
 
-    # Distribución de intensidades
-    dark_ratio = float((g_arr < 50).mean())
-    bright_ratio = float((g_arr > 200).mean())
-    mid_ratio = float(((g_arr >= 50) & (g_arr <= 200)).mean())
+    dark_ratio = float(g_hist[:DARK_LEVEL].sum() / g_total)
+    bright_ratio = float(g_hist[BRIGHT_LEVEL + 1:].sum() / g_total)
+    mid_ratio = float(g_hist[DARK_LEVEL:BRIGHT_LEVEL + 1].sum() / g_total)
 
     # Detectar dibujos tipo manga/cómic
-    if mid_ratio < 0.25 and (dark_ratio > 0.30 or bright_ratio > 0.30):
+    if mid_ratio < COMIC_MID_RATIO_MAX and (
+        dark_ratio > COMIC_EXTREME_RATIO or bright_ratio > COMIC_EXTREME_RATIO
+    ):
         return (
             False,
             "La imagen parece ser un dibujo en blanco y negro (cómic o ilustración), "
@@ -136,7 +204,7 @@ def validate_is_xray(img: Image.Image) -> Tuple[bool, str, float]:
         )
 
     # Necesitamos al menos algo de zonas oscuras y claras
-    if dark_ratio < 0.01 or bright_ratio < 0.002:
+    if dark_ratio < MIN_DARK_RATIO or bright_ratio < MIN_BRIGHT_RATIO:
         return (
             False,
             "La imagen no presenta el patrón de intensidades típico de una radiografía dental.",
@@ -158,7 +226,8 @@ def soft_check_panoramic(img: Image.Image) -> Tuple[bool, str, float]:
     width, height = img.size
     aspect_ratio = width / float(height)
 
-    if 1.4 <= aspect_ratio <= 4.0:
+    min_aspect, max_aspect = PANORAMIC_ASPECT_RANGE
+    if min_aspect <= aspect_ratio <= max_aspect:
         return True, "", aspect_ratio
 
     return False, f"Relación ancho/alto {aspect_ratio:.2f}:1 (podría no ser panorámica).", aspect_ratio
@@ -168,8 +237,48 @@ def soft_check_panoramic(img: Image.Image) -> Tuple[bool, str, float]:
 # 4. Función principal
 # ─────────────────────────────────────────────────────────────
 
+# Caché de resultados por contenido: reintentos y re-subidas del mismo
+# archivo no repiten la decodificación ni las estadísticas.
+# Clave: blake2b de los bytes + nombre en minúsculas (la extensión influye
+# en el resultado). LRUCache no es thread-safe: acceso bajo _validation_lock.
+_validation_cache: LRUCache = LRUCache(maxsize=settings.VALIDATION_CACHE_MAX_ENTRIES)
+_validation_lock = threading.Lock()
+
+
 def validate_dental_xray(file_bytes: bytes, filename: str) -> Tuple[bool, str, Dict]:
-    """Función principal de validación.""" 
+    """Función principal de validación (cacheada por contenido del archivo)."""
+    is_valid, msg, details, _ = validate_and_load_xray(file_bytes, filename)
+    return is_valid, msg, details
+
+
+def validate_and_load_xray(
+    file_bytes: bytes, filename: str
+) -> Tuple[bool, str, Dict, Optional[Image.Image]]:
+    """
+    Igual que validate_dental_xray, pero devuelve también la imagen RGB ya
+    decodificada para reutilizarla en la inferencia (el archivo se decodifica
+    una sola vez). La imagen es None si no es válida o si el resultado vino
+    de la caché (solo se cachea el veredicto, no los píxeles).
+    """
+    key = (hashlib.blake2b(file_bytes, digest_size=16).digest(), filename.lower())
+    with _validation_lock:
+        cached = _validation_cache.get(key)
+    pil_img = None
+    if cached is None:
+        is_valid, msg, details, pil_img = _validate_dental_xray(file_bytes, filename)
+        cached = (is_valid, msg, details)
+        with _validation_lock:
+            _validation_cache[key] = cached
+
+    is_valid, msg, details = cached
+    # Copia de details: el llamador puede modificarlo sin tocar la caché
+    return is_valid, msg, dict(details), pil_img
+
+
+def _validate_dental_xray(
+    file_bytes: bytes, filename: str
+) -> Tuple[bool, str, Dict, Optional[Image.Image]]:
+    """Validación completa sin caché (devuelve la imagen si es válida)."""
 
     details: Dict[str, object] = {
         "is_valid_image": False,
@@ -181,7 +290,7 @@ def validate_dental_xray(file_bytes: bytes, filename: str) -> Tuple[bool, str, D
 
     is_img, msg, pil_img = validate_image_file(file_bytes, filename)
     if not is_img or pil_img is None:
-        return False, msg, details
+        return False, msg, details, None
 
     details["is_valid_image"] = True
 
@@ -189,7 +298,7 @@ def validate_dental_xray(file_bytes: bytes, filename: str) -> Tuple[bool, str, D
     details["xray_confidence"] = float(xray_conf)
 
     if not is_xray:
-        return False, xray_msg, details
+        return False, xray_msg, details, None
 
     details["is_xray"] = True
 
@@ -198,9 +307,9 @@ def validate_dental_xray(file_bytes: bytes, filename: str) -> Tuple[bool, str, D
     details["panoramic_confidence"] = float(pano_score)
 
     if is_pano_like:
-        return True, " Radiografía dental válida (formato compatible con panorámica).", details
+        return True, " Radiografía dental válida (formato compatible con panorámica).", details, pil_img
     else:
         return True, (
             " Radiografía dental válida. "
             "Nota: por su formato podría no ser panorámica (periapical/bitewing u otro tipo)."
-        ), details
+        ), details, pil_img
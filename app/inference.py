@@ -1,10 +1,17 @@
 # app/inference.py
-from typing import Tuple, List, Dict, Any
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Tuple, List, Dict, Any, Optional, Sequence, Union
+import cv2
+import os
 import numpy as np
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
 import time
 
-from .model_store import get_model
+from .cache import (
+    get_cache, inference_cache_key, inference_cache_keys, load_inference,
+    submit_store_inference,
+)
+from .model_store import get_model, get_model_tag, get_predict_options
 from .settings import settings
 
 
@@ -16,15 +23,34 @@ CLASS_NAMES = {
 
 CLASS_COLORS = {0: (255, 0, 0), 1: (0, 255, 0), 2: (0, 0, 255)}
 
+# Las clases son densas (0..N-1): listas indexadas por id en lugar de
+# dict.get + f-string por detección
+_N_CLASSES = len(CLASS_NAMES)
+_CLASS_NAMES_ARR = [CLASS_NAMES[i] for i in range(_N_CLASSES)]
+_CLASS_COLORS_ARR = [CLASS_COLORS[i] for i in range(_N_CLASSES)]
+_UNKNOWN_COLOR = (255, 255, 0)
 
-def _font_pair():
-    try:
-        font = ImageFont.truetype("arial.ttf", 20)
-        font_small = ImageFont.truetype("arial.ttf", 16)
-    except:
-        font = ImageFont.load_default()
-        font_small = ImageFont.load_default()
-    return font, font_small
+
+# Etiquetas con la fuente vectorial de OpenCV (sin archivos de fuente)
+_LABEL_FONT = cv2.FONT_HERSHEY_SIMPLEX
+_LABEL_SCALE = 0.5
+_BOX_THICKNESS = 3
+
+# Partes fijas del reporte (se arman una sola vez)
+_REPORT_HEADER = "ANÁLISIS DE RADIOGRAFÍA DENTAL\n" + "=" * 50 + "\n\n"
+_REPORT_INTERPRETATION = ("", "INTERPRETACIÓN:", "-" * 50)
+_REPORT_FOOTER = "\n\nNOTA: Herramienta de apoyo. No reemplaza diagnóstico profesional."
+_REPORT_FINDINGS = {
+    0: "⚠️ Caries detectadas en dientes: ",
+    1: "⚠️ Dientes retenidos: ",
+    2: "⚠️ Pérdida ósea en dientes: ",
+}
+
+# Post-proceso de lotes en paralelo: la copia a NumPy y el dibujo con
+# OpenCV liberan el GIL, así que varias imágenes avanzan a la vez
+_postprocess_pool = ThreadPoolExecutor(
+    max_workers=os.cpu_count() or 1, thread_name_prefix="postprocess"
+)
 
 
 def calculate_fdi(x_center_norm: float, y_center_norm: float) -> int:
@@ -49,9 +75,125 @@ def calculate_fdi(x_center_norm: float, y_center_norm: float) -> int:
     return fdi_number
 
 
-def run_inference(image: Image.Image, confidence: float) -> Tuple[Image.Image, Dict[str, Any]]:
+def calculate_fdi_vec(x_center_norm: np.ndarray, y_center_norm: np.ndarray) -> np.ndarray:
     """
-    Ejecuta inferencia con medición de tiempos
+    Versión vectorizada de calculate_fdi: FDI de todas las detecciones en una
+    sola operación NumPy (mismas reglas que la versión escalar)
+    """
+    left = x_center_norm < 0.5
+    quadrant = np.where(
+        y_center_norm < 0.5, np.where(left, 1, 2), np.where(left, 4, 3)
+    )
+    
+    relative_x = np.mod(x_center_norm, 0.5) / 0.5
+    tooth_position = np.minimum((relative_x * 8).astype(np.int64) + 1, 8)
+    
+    return quadrant * 10 + tooth_position
+
+
+def _predict_input(
+    image: Image.Image,
+) -> Tuple[Any, Tuple[float, float], Optional[np.ndarray]]:
+    """
+    Prepara la entrada de model.predict.
+    - Imagen más grande que MODEL_IMGSZ: se reduce (lado mayor =
+      MODEL_IMGSZ, misma proporción). YOLO la reescala igual, pero la
+      conversión PIL→tensor y la copia al dispositivo crecen con los
+      píxeles de entrada.
+    - Imagen RGB que no se reduce: se convierte a NumPy una sola vez. El
+      array RGB sirve de lienzo para el dibujo y YOLO recibe su versión
+      BGR (con una imagen PIL haría su propia copia RGB + BGR).
+    Devuelve (entrada para predecir, factores (sx, sy) hacia el original,
+    lienzo RGB o None).
+    """
+    w, h = image.size
+    s = settings.MODEL_IMGSZ / max(w, h)
+    if settings.PREDICT_DOWNSCALE and s < 1:
+        size = (max(1, int(w * s)), max(1, int(h * s)))
+        small = image.resize(size, Image.Resampling.BILINEAR)
+        return small, (w / size[0], h / size[1]), None
+    
+    if image.mode != "RGB":
+        return image, (1.0, 1.0), None
+    canvas = np.array(image)
+    return cv2.cvtColor(canvas, cv2.COLOR_RGB2BGR), (1.0, 1.0), canvas
+
+
+def _cache_lookup(
+    image: Image.Image, confidence: float, total_start: float
+) -> Tuple[Optional[str], Optional[Tuple[Image.Image, Dict[str, Any]]]]:
+    """
+    Caché en dos niveles: memoria (LRU/TTL, sin E/S) y SQLite
+    (persistente). La misma imagen con la misma confianza y modelo no
+    vuelve a pasar por YOLO. Devuelve (clave o None, resultado o None)
+    """
+    memory_cache = get_cache()
+    if not (memory_cache.enabled or settings.ENABLE_INFERENCE_CACHE):
+        return None, None
+    
+    cache_key = inference_cache_key(image, confidence, get_model_tag())
+    return _cache_resolve(cache_key, memory_cache.lookup(cache_key), total_start)
+
+
+def _cache_lookup_many(
+    images: List[Image.Image], confidences: List[float], total_start: float
+) -> List[Tuple[Optional[str], Optional[Tuple[Image.Image, Dict[str, Any]]]]]:
+    """
+    Versión por lotes de _cache_lookup: las claves se calculan en paralelo
+    y la memoria se consulta con un solo lock. Un (clave, resultado) por imagen
+    """
+    memory_cache = get_cache()
+    if not (memory_cache.enabled or settings.ENABLE_INFERENCE_CACHE):
+        return [(None, None)] * len(images)
+    
+    keys = inference_cache_keys(images, confidences, get_model_tag())
+    return [
+        _cache_resolve(cache_key, cached, total_start)
+        for cache_key, cached in zip(keys, memory_cache.lookup_many(keys))
+    ]
+
+
+def _cache_resolve(
+    cache_key: str, cached: Optional[Any], total_start: float
+) -> Tuple[str, Optional[Tuple[Image.Image, Dict[str, Any]]]]:
+    """Completa un MISS de memoria con SQLite y arma el resultado del HIT"""
+    if cached is None and settings.ENABLE_INFERENCE_CACHE:
+        cached = load_inference(cache_key)
+        if cached is not None:
+            get_cache().store(cache_key, cached)
+    if cached is None:
+        return cache_key, None
+    
+    total_time = (time.time() - total_start) * 1000
+    print(f"[INFERENCE] ✓ Resultado desde caché - Total: {total_time:.0f}ms")
+    img_cached, payload = cached
+    # Copia superficial: el llamador agrega claves (image_base64)
+    # sin tocar la entrada cacheada. La imagen es de solo lectura
+    payload = dict(payload)
+    payload["performance"] = {"total_ms": round(total_time, 2), "cache_hit": True}
+    return cache_key, (img_cached, payload)
+
+
+def _cache_store(
+    cache_key: Optional[str], result: Tuple[Image.Image, Dict[str, Any]]
+) -> Tuple[Image.Image, Dict[str, Any]]:
+    """Guarda un resultado recién calculado en ambos niveles de caché"""
+    if cache_key is not None:
+        img_draw, payload = result
+        get_cache().store(cache_key, (img_draw, dict(payload)))
+        if settings.ENABLE_INFERENCE_CACHE:
+            # PNG + INSERT en segundo plano: la respuesta no los espera
+            submit_store_inference(cache_key, img_draw, payload)
+    return result
+
+
+def run_inference(
+    image: Image.Image, confidence: float, copy: bool = True
+) -> Tuple[Image.Image, Dict[str, Any]]:
+    """
+    Ejecuta inferencia con medición de tiempos.
+    Las cajas se dibujan sobre una copia. Con copy=False y sin detecciones
+    se devuelve `image` tal cual; úsalo solo si el llamador no la modifica.
     """
     total_start = time.time()
     
@@ -63,15 +205,116 @@ def run_inference(image: Image.Image, confidence: float) -> Tuple[Image.Image, D
     model_time = (time.time() - model_start) * 1000
     print(f"[INFERENCE] Modelo obtenido en {model_time:.0f}ms")
     
+    cache_key, cached = _cache_lookup(image, confidence, total_start)
+    if cached is not None:
+        return cached
+    
     # ═══════════════════════════════════════════════════════════════════
     # 2. Ejecutar predicción
     # ═══════════════════════════════════════════════════════════════════
     predict_start = time.time()
-    results = model.predict(source=image, conf=confidence, verbose=False)
+    source, scale, canvas = _predict_input(image)
+    results = model.predict(
+        source=source, conf=confidence, verbose=False, **get_predict_options()
+    )
     predict_time = (time.time() - predict_start) * 1000
     print(f"[INFERENCE] Predicción en {predict_time:.0f}ms")
     
-    result = results[0]
+    return _cache_store(cache_key, _postprocess(
+        results[0], image, copy, total_start, model_time, predict_time, scale, canvas
+    ))
+
+
+def run_inference_batch(
+    images: List[Image.Image], confidence: float
+) -> List[Tuple[Image.Image, Dict[str, Any]]]:
+    """
+    Inferencia por lotes: los aciertos de caché se resuelven sin YOLO y el
+    resto pasa por una sola llamada a model.predict (YOLO las procesa como
+    un batch), con post-proceso por imagen. Devuelve un (imagen anotada,
+    payload) por imagen, en orden.
+    """
+    if not images:
+        return []
+    return [fut.result() for fut in submit_inference_batch(images, confidence)]
+
+
+def submit_inference_batch(
+    images: List[Image.Image],
+    confidence: Union[float, Sequence[float]],
+    copy: bool = True,
+) -> List[Future]:
+    """
+    Etapa de predicción de la cola de inferencia (app/batcher.py):
+    resuelve los aciertos de caché, pasa el resto por model.predict en una
+    sola llamada (en el hilo actual) y encola el post-proceso de cada
+    imagen en _postprocess_pool. Devuelve un Future por imagen, en orden,
+    sin esperar al dibujo: el llamador puede predecir el siguiente lote
+    mientras este se dibuja.
+    
+    `confidence` puede ser una por imagen: el lote se predice con la menor
+    y cada resultado se filtra después con la suya (el NMS da las mismas
+    cajas por encima de cada umbral)
+    """
+    total_start = time.time()
+    if isinstance(confidence, (int, float)):
+        confidence = [confidence] * len(images)
+    
+    futures: List[Future] = []
+    pending = []
+    lookups = _cache_lookup_many(images, list(confidence), total_start)
+    for image, conf, (cache_key, cached) in zip(images, confidence, lookups):
+        fut = Future()
+        if cached is not None:
+            fut.set_result(cached)
+        else:
+            pending.append((image, conf, cache_key, fut))
+        futures.append(fut)
+    if not pending:
+        return futures
+    min_conf = min(conf for _, conf, _, _ in pending)
+    
+    model_start = time.time()
+    model = get_model()
+    model_time = (time.time() - model_start) * 1000
+    
+    predict_start = time.time()
+    sources, scales, canvases = zip(*(_predict_input(image) for image, _, _, _ in pending))
+    results = model.predict(
+        source=list(sources), conf=min_conf, verbose=False, **get_predict_options()
+    )
+    predict_time = (time.time() - predict_start) * 1000
+    print(f"[INFERENCE] Predicción de lote ({len(pending)} imágenes) en {predict_time:.0f}ms")
+    
+    def _finish(result, image, conf, cache_key, fut, scale, canvas):
+        try:
+            if conf > min_conf:
+                result = result[result.boxes.conf >= conf]
+            fut.set_result(_cache_store(cache_key, _postprocess(
+                result, image, copy, total_start, model_time, predict_time, scale, canvas
+            )))
+        except Exception as e:
+            fut.set_exception(e)
+    
+    for result, (image, conf, cache_key, fut), scale, canvas in zip(
+        results, pending, scales, canvases
+    ):
+        _postprocess_pool.submit(_finish, result, image, conf, cache_key, fut, scale, canvas)
+    return futures
+
+
+def _postprocess(
+    result, image: Image.Image, copy: bool,
+    total_start: float, model_time: float, predict_time: float,
+    scale: Tuple[float, float] = (1.0, 1.0),
+    canvas: Optional[np.ndarray] = None,
+) -> Tuple[Image.Image, Dict[str, Any]]:
+    """
+    Dibuja las detecciones de un resultado YOLO sobre la imagen y arma el
+    payload (detecciones, estadísticas, reporte y tiempos).
+    `scale` lleva las cajas de la imagen predicha a `image` y `canvas` es
+    la copia RGB de `image` ya creada para predecir (ver _predict_input)
+    """
     boxes = result.boxes
     
     # ═══════════════════════════════════════════════════════════════════
@@ -79,15 +322,9 @@ def run_inference(image: Image.Image, confidence: float) -> Tuple[Image.Image, D
     # ═══════════════════════════════════════════════════════════════════
     draw_start = time.time()
     
-    img_draw = image.copy()
-    draw = ImageDraw.Draw(img_draw)
-    font, font_small = _font_pair()
-    
     img_width, img_height = image.size
     
     class_counts = {0: 0, 1: 0, 2: 0}
-    class_conf = {0: [], 1: [], 2: []}
-    detections: List[Dict[str, Any]] = []
     
     teeth_fdi_map = {
         "Caries": [],
@@ -102,7 +339,7 @@ def run_inference(image: Image.Image, confidence: float) -> Tuple[Image.Image, D
         total_time = (time.time() - total_start) * 1000
         print(f"[INFERENCE] ✓ Sin detecciones - Total: {total_time:.0f}ms")
         
-        return img_draw, {
+        return image.copy() if copy else image, {
             "summary": {"total": 0, "per_class": {}},
             "detections": [],
             "stats": {},
@@ -118,40 +355,82 @@ def run_inference(image: Image.Image, confidence: float) -> Tuple[Image.Image, D
     # ═══════════════════════════════════════════════════════════════════
     # 5. Procesar detecciones
     # ═══════════════════════════════════════════════════════════════════
-    for box in boxes:
-        x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-        conf = float(box.conf[0].cpu().numpy())
-        cid = int(box.cls[0].cpu().numpy())
-        
-        x_center = (x1 + x2) / 2
-        y_center = (y1 + y2) / 2
-        x_center_norm = x_center / img_width
-        y_center_norm = y_center / img_height
-        
-        fdi_number = calculate_fdi(x_center_norm, y_center_norm)
-        
-        class_counts[cid] += 1
-        class_conf[cid].append(conf)
-        cname = CLASS_NAMES.get(cid, f"cls_{cid}")
-        color = CLASS_COLORS.get(cid, (255, 255, 0))
-        
-        draw.rectangle([(x1, y1), (x2, y2)], outline=color, width=3)
-        label = f"{cname} [{fdi_number}]: {conf:.1%}"
-        bbox_text = draw.textbbox((x1, y1 - 25), label, font=font_small)
-        draw.rectangle(bbox_text, fill=color)
-        draw.text((x1, y1 - 25), label, fill="white", font=font_small)
-        
-        detections.append({
+    # Estructura de arrays: boxes.data ([x1, y1, x2, y2, conf, cls] por
+    # caja) se copia del dispositivo en una sola transferencia; centros,
+    # FDI y conteos se calculan en NumPy sobre sus columnas
+    data = boxes.data.cpu().numpy()
+    xyxy = data[:, :4]
+    if scale != (1.0, 1.0):
+        sx, sy = scale
+        xyxy = xyxy * np.array([sx, sy, sx, sy], dtype=xyxy.dtype)
+    conf_np = data[:, -2].astype(np.float64)
+    cls_np = data[:, -1].astype(np.int64)
+    x_center_norm = (xyxy[:, 0] + xyxy[:, 2]).astype(np.float64) / 2 / img_width
+    y_center_norm = (xyxy[:, 1] + xyxy[:, 3]).astype(np.float64) / 2 / img_height
+    fdi_np = calculate_fdi_vec(x_center_norm, y_center_norm)
+    
+    counts_np = np.bincount(cls_np, minlength=_N_CLASSES)
+    class_counts.update(enumerate(counts_np.tolist()))
+    
+    # Estadísticas de confianza por clase en una pasada cada una
+    # (suma ponderada con bincount, mínimos/máximos con ufunc.at)
+    conf_sums = np.bincount(cls_np, weights=conf_np, minlength=_N_CLASSES)
+    conf_mins = np.full(len(counts_np), np.inf)
+    conf_maxs = np.full(len(counts_np), -np.inf)
+    np.minimum.at(conf_mins, cls_np, conf_np)
+    np.maximum.at(conf_maxs, cls_np, conf_np)
+    conf_avgs = (conf_sums / np.maximum(counts_np, 1)).tolist()
+    conf_mins = conf_mins.tolist()
+    conf_maxs = conf_maxs.tolist()
+    
+    confs = conf_np.tolist()
+    cids = cls_np.tolist()
+    fdi_all = fdi_np.tolist()
+    bboxes = xyxy.astype(np.int64).tolist()
+    cnames = [
+        _CLASS_NAMES_ARR[cid] if 0 <= cid < _N_CLASSES else f"cls_{cid}"
+        for cid in cids
+    ]
+    
+    detections: List[Dict[str, Any]] = [
+        {
             "class_id": cid,
             "class_name": cname,
             "confidence": conf,
-            "bbox": [int(x1), int(y1), int(x2), int(y2)],
+            "bbox": bbox,
             "fdi": fdi_number,
             "tooth_fdi": fdi_number,
-        })
+        }
+        for cid, cname, conf, bbox, fdi_number in zip(cids, cnames, confs, bboxes, fdi_all)
+    ]
+    
+    # Dibujo con OpenCV sobre un array RGB: primitivas en C sin maquetar
+    # texto con FreeType por etiqueta (el array ya es una copia de `image`)
+    if canvas is None:
+        canvas = np.array(image)
+    for (x1, y1, x2, y2), cid, cname, conf, fdi_number in zip(
+        bboxes, cids, cnames, confs, fdi_all
+    ):
+        color = _CLASS_COLORS_ARR[cid] if 0 <= cid < _N_CLASSES else _UNKNOWN_COLOR
         
-        if fdi_number not in teeth_fdi_map[cname]:
-            teeth_fdi_map[cname].append(fdi_number)
+        cv2.rectangle(canvas, (x1, y1), (x2, y2), color, _BOX_THICKNESS)
+        label = f"{cname} [{fdi_number}]: {conf:.1%}"
+        (text_w, text_h), baseline = cv2.getTextSize(label, _LABEL_FONT, _LABEL_SCALE, 1)
+        cv2.rectangle(
+            canvas, (x1, y1 - text_h - baseline - 6), (x1 + text_w + 4, y1), color, cv2.FILLED
+        )
+        cv2.putText(
+            canvas, label, (x1 + 2, y1 - baseline - 3),
+            _LABEL_FONT, _LABEL_SCALE, (255, 255, 255), 1, cv2.LINE_AA,
+        )
+    img_draw = Image.fromarray(canvas)
+    
+    # Dientes afectados por clase: set para deduplicar (O(1) por caja) y
+    # una sola ordenación por clase
+    teeth_sets = {cname: set() for cname in teeth_fdi_map}
+    for cname, fdi_number in zip(cnames, fdi_all):
+        teeth_sets[cname].add(fdi_number)
+    teeth_fdi_map = {cname: sorted(fdis) for cname, fdis in teeth_sets.items()}
     
     draw_time = (time.time() - draw_start) * 1000
     print(f"[INFERENCE] Dibujo en {draw_time:.0f}ms")
@@ -164,54 +443,43 @@ def run_inference(image: Image.Image, confidence: float) -> Tuple[Image.Image, D
     for cid, count in class_counts.items():
         if count > 0:
             cname = CLASS_NAMES[cid]
-            arr = class_conf[cid]
             per_class[cname] = count
             stats[cname] = {
                 "count": count,
-                "conf_avg": float(np.mean(arr)),
-                "conf_min": float(np.min(arr)),
-                "conf_max": float(np.max(arr)),
+                "conf_avg": conf_avgs[cid],
+                "conf_min": conf_mins[cid],
+                "conf_max": conf_maxs[cid],
             }
     
     # ═══════════════════════════════════════════════════════════════════
     # 7. Generar reporte
     # ═══════════════════════════════════════════════════════════════════
-    report_lines = ["ANÁLISIS DE RADIOGRAFÍA DENTAL", "=" * 50, ""]
     total = sum(class_counts.values())
-    report_lines.append(f"Total de detecciones: {total}\n")
-    
-    for cid, count in class_counts.items():
-        if count > 0:
-            cname = CLASS_NAMES[cid]
-            fdi_list = teeth_fdi_map[cname]
-            fdi_str = ", ".join(map(str, sorted(fdi_list)))
-            report_lines.append(
-                f"{cname}: {count} (conf prom {np.mean(class_conf[cid]):.1%})"
-            )
-            report_lines.append(f"  └─ Dientes: {fdi_str}")
+    report_lines = [f"Total de detecciones: {total}\n"]
     
-    report_lines += ["", "INTERPRETACIÓN:", "-" * 50]
+    # Lista de dientes por clase presente (se usa en el resumen y en la
+    # interpretación)
+    fdi_strs = {
+        cid: ", ".join(map(str, teeth_fdi_map[CLASS_NAMES[cid]]))
+        for cid, count in class_counts.items() if count > 0
+    }
     
-    if class_counts[0] > 0:
-        fdi_str = ", ".join(map(str, sorted(teeth_fdi_map["Caries"])))
-        report_lines.append(f"⚠️ Caries detectadas en dientes: {fdi_str}")
+    for cid, fdi_str in fdi_strs.items():
+        cname = CLASS_NAMES[cid]
+        report_lines.append(
+            f"{cname}: {class_counts[cid]} (conf prom {stats[cname]['conf_avg']:.1%})"
+        )
+        report_lines.append(f"  └─ Dientes: {fdi_str}")
     
-    if class_counts[1] > 0:
-        fdi_str = ", ".join(map(str, sorted(teeth_fdi_map["Diente_Retenido"])))
-        report_lines.append(f"⚠️ Dientes retenidos: {fdi_str}")
+    report_lines += _REPORT_INTERPRETATION
     
-    if class_counts[2] > 0:
-        fdi_str = ", ".join(map(str, sorted(teeth_fdi_map["Perdida_Osea"])))
-        report_lines.append(f"⚠️ Pérdida ósea en dientes: {fdi_str}")
+    for cid, prefix in _REPORT_FINDINGS.items():
+        if cid in fdi_strs:
+            report_lines.append(prefix + fdi_strs[cid])
     
     if total == 0:
         report_lines.append("✅ Sin hallazgos significativos")
     
-    report_lines += [
-        "",
-        "NOTA: Herramienta de apoyo. No reemplaza diagnóstico profesional.",
-    ]
-    
     # ═══════════════════════════════════════════════════════════════════
     # 8. Resultado final
     # ═══════════════════════════════════════════════════════════════════
@@ -222,7 +490,7 @@ def run_inference(image: Image.Image, confidence: float) -> Tuple[Image.Image, D
         "summary": {"total": total, "per_class": per_class},
         "detections": detections,
         "stats": stats,
-        "report_text": "\n".join(report_lines),
+        "report_text": _REPORT_HEADER + "\n".join(report_lines) + _REPORT_FOOTER,
         "teeth_fdi": teeth_fdi_map,
         "performance": {
             "total_ms": round(total_time, 2),
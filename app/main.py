@@ -4,17 +4,13 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from .router import router
 from .settings import settings, print_optimization_settings  # ← AGREGADO
-from .model_store import get_model
+from .model_store import warmup
+from .batcher import inference_batcher
+from .image_io import close_http_client
 
 # BASE DE DATOS Y AUTENTICACIÓN
-from . import models
-from .database import engine
-from .auth import router as auth_router
-
-# CREAR TABLAS DE BASE DE DATOS AL INICIAR
-print("Creando tablas de base de datos...")
-models.Base.metadata.create_all(bind=engine)
-print("Tablas creadas: users, analyses")
+from .migrations import init_db
+from .auth import router as auth_router, debug_router as auth_debug_router
 
 # APLICACIÓN FASTAPI
 app = FastAPI(
@@ -36,18 +32,14 @@ default_origins = [
 ]
 
 # Orígenes adicionales desde variable de entorno (si existe)
-env_origins = []
-if settings.CORS_ALLOW_ORIGINS:
-    env_origins = [o.strip() for o in settings.CORS_ALLOW_ORIGINS.split(",") if o.strip()]
-
-# Combinar ambas listas y eliminar duplicados
-all_origins = list(set(default_origins + env_origins))
+env_origins = [o.strip() for o in settings.CORS_ALLOW_ORIGINS.split(",") if o.strip()]
 
-print(f"CORS allow_origins = {all_origins}")
+# Combinar ambas listas sin duplicados (orden estable: primero los base)
+_ALL_ORIGINS = tuple(dict.fromkeys(default_origins + env_origins))
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=all_origins,
+    allow_origins=list(_ALL_ORIGINS),
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -60,16 +52,32 @@ def startup_event():
     
     # IMPRIMIR CONFIGURACIÓN DE OPTIMIZACIÓN
     print_optimization_settings()  # ← AGREGADO
+    print(f"CORS allow_origins = {list(_ALL_ORIGINS)}")
+    
+    # CREAR TABLAS / COLUMNAS NUEVAS (aquí y no al importar app.main)
+    init_db()
     
-    _ = get_model()
+    # Carga + predicción de prueba: la primera petición no paga el arranque
+    warmup()
     print("Modelo YOLO cargado")
+    if settings.ENABLE_INFERENCE_BATCHER:
+        inference_batcher.start()
     print("Base de datos SQLite lista (dental.db)")
     print("API corriendo")
     print("Documentación en /docs")
 
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Detiene la cola de inferencia y cierra el cliente HTTP"""
+    await inference_batcher.stop()
+    await close_http_client()
+
 # INCLUSIÓN DE ROUTERS
 app.include_router(auth_router)  # /auth/register, /auth/login, etc.
 app.include_router(router)       # /analyze, /analyze-public, /analyses, ...
+if settings.DEBUG:
+    app.include_router(auth_debug_router)  # /auth/performance-test
 
 # ENDPOINT RAÍZ
 @app.get("/")
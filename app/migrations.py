@@ -0,0 +1,41 @@
+# app/migrations.py
+"""
+Esquema de la base de datos: create_all + columnas e índices nuevos.
+No hay Alembic: create_all no agrega columnas a tablas existentes, así que
+las BD anteriores las reciben aquí. Se llama de forma explícita (evento
+startup, maestro de gunicorn) y nunca al importar: los tests pueden
+aplicarlo sobre un engine temporal sin tocar dental.db.
+"""
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from . import models
+from .database import engine as default_engine
+
+# (tabla, columna, tipo, UPDATE opcional para completar las filas existentes)
+_NEW_COLUMNS = [
+    ("analyses", "image_key", "VARCHAR(512)", None),
+    (
+        "users", "analysis_counter", "INTEGER NOT NULL DEFAULT 0",
+        "UPDATE users SET analysis_counter = COALESCE("
+        "(SELECT MAX(per_user_index) FROM analyses WHERE user_id = users.id), 0)",
+    ),
+]
+
+
+def init_db(engine: Engine = None):
+    """Crea las tablas y aplica columnas/índices nuevos (idempotente)"""
+    engine = engine or default_engine
+    print("Creando tablas de base de datos...")
+    models.Base.metadata.create_all(bind=engine)
+    for table, column, ddl, backfill in _NEW_COLUMNS:
+        if column not in {c["name"] for c in inspect(engine).get_columns(table)}:
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+                if backfill:
+                    conn.execute(text(backfill))
+            print(f"Columna agregada: {table}.{column}")
+    # Igual con los índices nuevos de tablas ya existentes
+    for index in models.Analysis.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+    print("Tablas creadas: users, analyses, inference_cache, revoked_tokens")
@@ -1,73 +1,52 @@
 # app/model_store.py
 # ---------------------------------------------------------
 # Parche para PyTorch 2.6+ en Render
-# Se aplica ANTES de importar Ultralytics/YOLO
+# Se aplica ANTES de importar Ultralytics/YOLO (en el primer get_model)
 # ---------------------------------------------------------
+import importlib
+import inspect
 import os
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+# Clases permitidas al deserializar el checkpoint: (módulo, nombres).
+# Los nombres que no existan en la versión instalada se omiten
+_ALLOW_SPEC = (
+    # Contenedores y clases estándar de PyTorch usadas en YOLO
+    ("torch.nn", ("Sequential", "ModuleList", "ModuleDict")),
+    ("torch.nn.modules.activation", ("SiLU",)),
+    ("torch.nn.modules.batchnorm", ("BatchNorm2d",)),
+    ("torch.nn.modules.conv", ("Conv2d",)),
+    # Clases típicas de Ultralytics/YOLO
+    ("ultralytics.nn.tasks", (
+        "DetectionModel", "SegmentationModel", "ClassificationModel", "PoseModel",
+    )),
+    ("ultralytics.nn.modules.conv", ("Conv", "DWConv", "RepConv")),
+    ("ultralytics.nn.modules.block", ("C2f", "SPPF")),
+    ("ultralytics.nn.modules.head", ("Detect",)),
+)
 
 def _apply_torch_patches():
     """
     Parche para cargar modelos YOLO en PyTorch 2.6+.
     - Amplía la lista de clases permitidas.
     - Fuerza torch.load(weights_only=False) para compatibilidad.
+    Idempotente: si el módulo se recarga, torch.load no se envuelve otra vez.
     """
     try:
         import torch
+        if getattr(torch, "_allowlist_patched", False):
+            return
         from torch.serialization import add_safe_globals
         from collections import OrderedDict
 
-        # Contenedores básicos
-        try:
-            from torch.nn import Sequential, ModuleList, ModuleDict
-            base_allow = [Sequential, ModuleList, ModuleDict, OrderedDict]
-        except Exception:
-            base_allow = [OrderedDict]
-
-        allow = list(base_allow)
-
-        # ---- Clases estándar de PyTorch usadas en YOLO ----
-        try:
-            from torch.nn.modules.activation import SiLU
-            allow.append(SiLU)
-        except Exception:
-            pass
-
-        try:
-            from torch.nn.modules.batchnorm import BatchNorm2d
-            allow.append(BatchNorm2d)
-        except Exception:
-            pass
-
-        try:
-            from torch.nn.modules.conv import Conv2d
-            allow.append(Conv2d)
-        except Exception:
-            pass
-
-        # ---- Clases típicas de Ultralytics/YOLO ----
-        try:
-            from ultralytics.nn.tasks import DetectionModel
-            allow.append(DetectionModel)
-        except Exception:
-            pass
-
-        try:
-            from ultralytics.nn.modules.conv import Conv, DWConv, RepConv
-            allow += [Conv, DWConv, RepConv]
-        except Exception:
-            pass
-
-        try:
-            from ultralytics.nn.modules.block import C2f, SPPF
-            allow += [C2f, SPPF]
-        except Exception:
-            pass
-
-        try:
-            from ultralytics.nn.modules.head import Detect
-            allow.append(Detect)
-        except Exception:
-            pass
+        allow = [OrderedDict]
+        for module_name, names in _ALLOW_SPEC:
+            try:
+                module = importlib.import_module(module_name)
+            except ImportError:
+                continue  # módulo ausente en esta versión de torch/Ultralytics
+            allow.extend(getattr(module, n) for n in names if hasattr(module, n))
 
         # Registrar clases en safe_globals (por si se usa el modo seguro)
         try:
@@ -77,13 +56,20 @@ def _apply_torch_patches():
 
         #  CRÍTICO: forzar weights_only=False en torch.load
         _orig_load = torch.load
+        # torch >= 2.1: los checkpoints en archivo se leen con mmap (los
+        # tensores salen de la page cache, sin un buffer intermedio)
+        _supports_mmap = "mmap" in inspect.signature(_orig_load).parameters
 
         def _patched_load(*args, **kwargs):
             # Si el usuario no pasa weights_only, lo forzamos a False
             kwargs.setdefault("weights_only", False)
+            source = args[0] if args else kwargs.get("f")
+            if _supports_mmap and isinstance(source, (str, os.PathLike)):
+                kwargs.setdefault("mmap", True)
             return _orig_load(*args, **kwargs)
 
         torch.load = _patched_load
+        torch._allowlist_patched = True
 
         print("[torch-allowlist] Parche activo: torch.load con weights_only=False")
 
@@ -92,46 +78,335 @@ def _apply_torch_patches():
         # En producción es mejor fallar aquí que arrancar sin poder cargar el modelo
         raise
 
-# Ejecutar el parche ANTES de importar YOLO
-_apply_torch_patches()
-
 # ---------------------------------------------------------
 # Resto del código original
 # ---------------------------------------------------------
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
 import requests
-from ultralytics import YOLO
 from .settings import settings
 
+try:
+    import fcntl
+except ImportError:  # Windows: sin lock entre procesos
+    fcntl = None
+
+if TYPE_CHECKING:
+    from ultralytics import YOLO
+
 _model = None
 _model_path = None
+_model_tag = None
+# Serializa la primera carga: peticiones simultáneas en frío no
+# descargan ni construyen el modelo dos veces
+_model_lock = threading.Lock()
+
+# Buffer de copia para la descarga del modelo (1 MiB)
+_DOWNLOAD_CHUNK = 1 << 20
+
+# Backends exportables: formato de YOLO.export → extensión del archivo
+_EXPORT_SUFFIX = {"onnx": ".onnx", "engine": ".engine"}
+
+
+@lru_cache(maxsize=1)
+def _yolo_class():
+    """
+    Carga diferida de torch/Ultralytics (varios segundos): importar este
+    módulo es liviano y el parche + la importación pesada ocurren una sola
+    vez, al cargar el modelo
+    """
+    _apply_torch_patches()
+    from ultralytics import YOLO
+    return YOLO
+
+
+@lru_cache(maxsize=1)
+def _backend() -> str:
+    """
+    Backend efectivo: MODEL_BACKEND, con "auto" resuelto según el hardware
+    (TensorRT con CUDA, ONNX en CPU)
+    """
+    backend = settings.MODEL_BACKEND
+    if backend != "auto":
+        return backend
+    import torch
+    return "engine" if torch.cuda.is_available() else "onnx"
+
+
+def _configure_torch():
+    """
+    Ajustes de torch antes de cargar el modelo: reparte los núcleos entre
+    los workers (sin sobresuscripción de hilos) y, con CUDA, deja que
+    cuDNN elija el kernel más rápido por tamaño de entrada y use TF32
+    """
+    import torch
+    threads = settings.TORCH_NUM_THREADS or max(
+        1, (os.cpu_count() or 1) // max(1, settings.WEB_CONCURRENCY)
+    )
+    torch.set_num_threads(threads)
+    if torch.cuda.is_available():
+        torch.backends.cudnn.benchmark = True
+        torch.backends.cuda.matmul.allow_tf32 = True
+        torch.backends.cudnn.allow_tf32 = True
+    print(f"[model_store] torch: {threads} hilo(s), CUDA={torch.cuda.is_available()}")
+
+
+@lru_cache(maxsize=1)
+def get_predict_options() -> dict:
+    """
+    Opciones de model.predict según el hardware (se detecta una sola vez):
+    con CUDA se usa la GPU 0 y, con pesos PyTorch, FP16 (los modelos
+    exportados ya fijan su precisión)
+    """
+    import torch
+    if not torch.cuda.is_available():
+        return {}
+    return {"device": 0, "half": _backend() == "pytorch"}
+
+def _read_etag(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def _write_etag(path: str, etag: Optional[str]):
+    if etag:
+        with open(path, "w") as f:
+            f.write(etag)
+    elif os.path.exists(path):
+        os.remove(path)
+
+@contextmanager
+def _download_lock(dest: str):
+    """
+    Lock exclusivo entre procesos mientras se descarga: varios workers que
+    arrancan a la vez esperan al primero en lugar de descargar en paralelo
+    """
+    with open(dest + ".lock", "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+def _stream_download(url: str, dest: str, etag: Optional[str] = None) -> bool:
+    """
+    Descarga el modelo por bloques directo a disco (memoria pico ~1 MiB, no
+    el tamaño del .pt). Se escribe en dest.part y solo se renombra a dest si
+    el tamaño (Content-Length) y el SHA-256 opcional coinciden: una descarga
+    cortada no deja un .pt corrupto que bloquee los siguientes arranques.
+    
+    - Reanudación: si un arranque anterior dejó dest.part (con su ETag en
+      dest.part.etag), se pide solo el resto con Range + If-Range. Si el
+      archivo cambió en el servidor, este responde 200 y se empieza de cero.
+    - Revalidación: con `etag` (el del .pt ya presente) la petición es
+      condicional; 304 conserva el archivo y devuelve False.
+    El ETag del .pt descargado queda en dest.etag.
+    """
+    tmp = dest + ".part"
+    tmp_etag_path = tmp + ".etag"
+    # Sin compresión: los rangos y Content-Length se refieren al archivo
+    headers = {"Accept-Encoding": "identity"}
+    offset = 0
+    part_etag = _read_etag(tmp_etag_path)
+    if part_etag and os.path.exists(tmp):
+        offset = os.path.getsize(tmp)
+        headers["Range"] = f"bytes={offset}-"
+        headers["If-Range"] = part_etag
+    elif etag:
+        headers["If-None-Match"] = etag
+    
+    print(f"[model_store] Descargando modelo desde {url}...")
+    digest = hashlib.sha256()
+    written = 0
+    try:
+        with requests.get(url, headers=headers, stream=True, timeout=300) as r:
+            if r.status_code == 304:
+                print("[model_store] Modelo sin cambios en el servidor (ETag)")
+                return False
+            if r.status_code == 416 and offset:
+                # El parcial ya no corresponde al archivo: empezar de cero
+                os.remove(tmp)
+                _write_etag(tmp_etag_path, None)
+                return _stream_download(url, dest, etag)
+            r.raise_for_status()
+            
+            if r.status_code == 206:
+                print(f"[model_store] Reanudando descarga desde {offset / 1e6:.1f} MB")
+                # El SHA-256 cubre el archivo completo: incluir lo ya bajado
+                with open(tmp, "rb") as f:
+                    for chunk in iter(lambda: f.read(_DOWNLOAD_CHUNK), b""):
+                        digest.update(chunk)
+                mode = "ab"
+            else:
+                offset = 0
+                mode = "wb"
+            # ETag del parcial: permite reanudarlo si este arranque se corta
+            _write_etag(tmp_etag_path, r.headers.get("ETag"))
+            
+            expected = r.headers.get("Content-Length")
+            with open(tmp, mode) as f:
+                for chunk in r.iter_content(chunk_size=_DOWNLOAD_CHUNK):
+                    f.write(chunk)
+                    digest.update(chunk)
+                    written += len(chunk)
+        
+        total = offset + written
+        if expected is not None and written != int(expected):
+            raise IOError(f"Descarga incompleta: {total} de {offset + int(expected)} bytes")
+        if settings.MODEL_SHA256 and digest.hexdigest() != settings.MODEL_SHA256.lower():
+            # Archivo completo pero distinto: no sirve para reanudar
+            os.remove(tmp)
+            _write_etag(tmp_etag_path, None)
+            raise IOError("El SHA-256 del modelo descargado no coincide con MODEL_SHA256")
+        os.replace(tmp, dest)
+        _write_etag(dest + ".etag", _read_etag(tmp_etag_path))
+        # Hash del archivo completo (ya calculado al descargar) para
+        # verificar el .pt en los siguientes arranques
+        _write_etag(dest + ".sha256", digest.hexdigest())
+        _write_etag(tmp_etag_path, None)
+    except BaseException:
+        # Un parcial sin ETag no se puede reanudar con seguridad
+        if os.path.exists(tmp) and not _read_etag(tmp_etag_path):
+            os.remove(tmp)
+        raise
+    print(f"[model_store] Modelo descargado en {dest} ({total / 1e6:.1f} MB)")
+    return True
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_DOWNLOAD_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _local_model_ok(dest: str) -> bool:
+    """
+    Compara el .pt con MODEL_SHA256 (o, si no está configurado, con el
+    SHA-256 guardado al descargarlo): un archivo dañado en disco se detecta
+    aquí (~40 ms para 50 MB) y no como un error de unpickling dentro de
+    torch.load. El hash configurado manda: el .sha256 vive junto al .pt y
+    no puede validar un archivo reemplazado
+    """
+    expected = settings.MODEL_SHA256 or _read_etag(dest + ".sha256")
+    if not expected:
+        return True
+    return _file_sha256(dest) == expected.lower()
 
 def _download_model_if_needed():
     """Descarga el .pt si MODEL_URL está definido, caso contrario usa almacenamiento local."""
     global _model_path
     if settings.MODEL_URL:
         dest = settings.MODEL_LOCAL_PATH
-        if not os.path.exists(dest):
-            print(f"[model_store] Descargando modelo desde {settings.MODEL_URL}...")
-            r = requests.get(str(settings.MODEL_URL), timeout=60)
-            r.raise_for_status()
-            with open(dest, "wb") as f:
-                f.write(r.content)
-            print(f"[model_store] Modelo descargado en {dest}")
+        with _download_lock(dest):
+            if os.path.exists(dest) and not _local_model_ok(dest):
+                print("[model_store] ⚠️ El modelo local no coincide con su hash: se vuelve a descargar")
+                os.remove(dest)
+            # Otro worker pudo terminar la descarga mientras se esperaba
+            if not os.path.exists(dest):
+                _stream_download(str(settings.MODEL_URL), dest)
+            elif settings.MODEL_REVALIDATE:
+                etag = _read_etag(dest + ".etag")
+                try:
+                    if etag:
+                        _stream_download(str(settings.MODEL_URL), dest, etag)
+                except Exception as e:
+                    print(f"[model_store] ⚠️ No se pudo revalidar el modelo: {e}. Se usa el local")
         _model_path = dest
     else:
         _model_path = settings.MODEL_LOCAL_PATH
         if not os.path.exists(_model_path):
             raise FileNotFoundError(f"Modelo no encontrado en {_model_path}")
 
-def get_model() -> YOLO:
+def _exported_model_path() -> str:
+    """
+    Ruta del modelo exportado según settings.MODEL_BACKEND (ONNX/TensorRT).
+    La exportación se hace una sola vez y queda junto al .pt (se rehace si
+    el .pt es más nuevo, p. ej. tras descargar otro modelo); si falla
+    (dependencias o GPU no disponibles) se usa el .pt original.
+    """
+    backend = _backend()
+    suffix = _EXPORT_SUFFIX.get(backend)
+    if suffix is None:
+        if backend != "pytorch":
+            print(f"[model_store] Backend desconocido '{backend}', se usa PyTorch")
+        return _model_path
+
+    exported = os.path.splitext(_model_path)[0] + suffix
+    if os.path.exists(exported) and os.stat(exported).st_mtime >= os.stat(_model_path).st_mtime:
+        return exported
+
+    print(f"[model_store] Exportando modelo a {backend} (una sola vez)...")
+    try:
+        exported = _yolo_class()(_model_path).export(
+            format=backend,
+            imgsz=settings.MODEL_IMGSZ,
+            half=(backend == "engine"),  # FP16 solo con TensorRT (GPU)
+        )
+    except Exception as e:
+        print(f"[model_store] ⚠️ No se pudo exportar a {backend}: {e}. Se usa PyTorch")
+        return _model_path
+    print(f"[model_store] Modelo exportado en {exported}")
+    return exported
+
+def get_model() -> "YOLO":
     """Devuelve instancia singleton del modelo YOLO."""
-    global _model
-    if _model is None:
-        _download_model_if_needed()
-        print(f"[model_store] Cargando modelo desde: {_model_path}")
-        _model = YOLO(_model_path)
-        print("[model_store] Modelo cargado exitosamente")
+    global _model, _model_tag
+    if _model is not None:  # camino caliente: sin lock ni E/S
+        return _model
+    
+    with _model_lock:
+        if _model is None:
+            _download_model_if_needed()
+            path = _exported_model_path()
+            print(f"[model_store] Cargando modelo desde: {path}")
+            _configure_torch()
+            model = _yolo_class()(path, task="detect")
+            # Identidad de los pesos cargados: se fija aquí y no se vuelve
+            # a consultar el disco en cada inferencia
+            _model_tag = _compute_model_tag()
+            _model = model
+            print("[model_store] Modelo cargado exitosamente")
     return _model
 
+def warmup() -> "YOLO":
+    """
+    Carga el modelo y ejecuta una predicción de prueba al arrancar: la
+    primera llamada a predict arma el predictor de Ultralytics (y el
+    contexto CUDA), ~1.5 s que si no paga la primera petición real
+    """
+    model = get_model()
+    start = time.time()
+    try:
+        import numpy as np
+        dummy = np.zeros((settings.MODEL_IMGSZ, settings.MODEL_IMGSZ, 3), dtype=np.uint8)
+        model.predict(source=dummy, verbose=False, **get_predict_options())
+    except Exception as e:
+        print(f"[model_store] ⚠️ Falló el calentamiento del modelo: {e}")
+        return model
+    print(f"[model_store] Modelo calentado en {(time.time() - start) * 1000:.0f}ms")
+    return model
+
 def get_model_path() -> str:
     return _model_path or settings.MODEL_LOCAL_PATH
+
+def get_model_tag() -> str:
+    """
+    Identifica los pesos en uso (ruta, fecha de modificación y backend) para
+    invalidar resultados cacheados cuando el modelo cambia
+    """
+    return _model_tag or _compute_model_tag()
+
+def _compute_model_tag() -> str:
+    path = get_model_path()
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        mtime = 0
+    return f"{path}:{mtime}:{_backend()}"
@@ -1,5 +1,8 @@
 # app/models.py
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Float, ForeignKey
+from sqlalchemy import (
+    Column, Integer, String, Boolean, DateTime, Text, Float, ForeignKey, LargeBinary,
+    Index, desc,
+)
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -10,9 +13,12 @@ class User(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String(255), unique=True, index=True, nullable=False)
-    password_hash = Column(String(255), nullable=False)
+    # bcrypt: siempre 60 caracteres ($2b$RR$ + sal + hash)
+    password_hash = Column(String(60), nullable=False)
     name = Column(String(255), nullable=True)
     is_active = Column(Boolean, default=True)
+    # último per_user_index asignado (se incrementa al guardar un análisis)
+    analysis_counter = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime, default=datetime.utcnow)
 
     analyses = relationship("Analysis", back_populates="user")
@@ -29,12 +35,16 @@ class Analysis(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
 
     # nombre original del archivo
-    image_filename = Column(String(255), nullable=True)
+    image_filename = Column(String(128), nullable=True)
 
-    # imagen ANOTADA en base64 (PNG) para el historial
+    # imagen ANOTADA del historial: clave relativa a settings.IMAGE_DIR
+    # (ver app/image_store.py)
+    image_key = Column(String(512), nullable=True)
+
+    # análisis antiguos: imagen anotada en base64 (JPEG o PNG) dentro de la fila
     image_base64 = Column(Text, nullable=True)
 
-    model_used = Column(String(50), default="best.pt")
+    model_used = Column(String(32), default="best.pt")
     confidence = Column(Float, default=0.25)
 
     total_detections = Column(Integer, default=0)
@@ -53,3 +63,36 @@ class Analysis(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User", back_populates="analyses")
+
+    # Historial: WHERE user_id = ? ORDER BY created_at DESC se resuelve
+    # recorriendo el índice (sin escanear la tabla ni ordenar)
+    __table_args__ = (
+        Index("ix_analyses_user_created", "user_id", desc("created_at")),
+    )
+
+
+class InferenceCache(Base):
+    """Caché persistente de inferencias (ver app/cache.py)"""
+    __tablename__ = "inference_cache"
+
+    # blake2b de píxeles + confianza + modelo
+    key = Column(String(32), primary_key=True)
+
+    # payload de run_inference en JSON
+    payload_json = Column(Text, nullable=False)
+
+    # imagen anotada en PNG
+    image_png = Column(LargeBinary, nullable=False)
+
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class RevokedToken(Base):
+    """Tokens cerrados con /auth/logout (se rechazan hasta su exp)"""
+    __tablename__ = "revoked_tokens"
+
+    # sha256 del token (no se guarda el token en claro)
+    token_hash = Column(String(64), primary_key=True)
+
+    # exp del token: pasada esta fecha la fila ya no hace falta
+    expires_at = Column(DateTime, nullable=False, index=True)
@@ -1,17 +1,26 @@
 # app/router.py
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends
-from fastapi.responses import JSONResponse
-from typing import Optional
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, Response
+from typing import List, Optional
+from pydantic import TypeAdapter
+from sqlalchemy import or_, update
 from sqlalchemy.orm import Session
+import asyncio
+import base64
+import httpx
 import json
+from collections import Counter
 from datetime import datetime, timezone, timedelta
 
 from .settings import settings
-from .image_io import pil_from_upload, pil_from_url, img_to_base64_png
-from .inference import run_inference, CLASS_NAMES, CLASS_COLORS
+from .image_io import pil_from_upload, bytes_from_url, img_to_base64_jpeg
+from .inference import run_inference, run_inference_batch, CLASS_NAMES, CLASS_COLORS
+from .batcher import inference_batcher
 from .model_store import get_model_path
 from .schemas import AnalyzeResponse, AnalyzeUrlRequest
-from .image_validator import validate_dental_xray  
+from .image_validator import validate_and_load_xray
+from .image_store import save_image_base64, image_path, delete_image
 
 # auth + BD + modelos
 from .dependencies import get_db
@@ -27,18 +36,114 @@ PERU_TZ = timezone(timedelta(hours=-5))
 # -------------------------------------------------------------------
 # Helpers
 # -------------------------------------------------------------------
+# Bloque de lectura de archivos subidos (64 KiB)
+_UPLOAD_CHUNK = 1 << 16
+
+
+async def _read_upload(file: UploadFile) -> bytes:
+    """
+    Lee el archivo subido por bloques con tope MAX_UPLOAD_BYTES: uno
+    demasiado grande se rechaza con 413 apenas se pasa del límite, sin
+    cargarlo completo en memoria
+    """
+    limit = settings.MAX_UPLOAD_BYTES
+    too_large = HTTPException(
+        status_code=413,
+        detail=f"{file.filename}: El archivo supera el máximo de {limit // (1024 * 1024)} MB",
+    )
+    if file.size is not None and file.size > limit:
+        raise too_large
+
+    chunks, size = [], 0
+    while chunk := await file.read(_UPLOAD_CHUNK):
+        size += len(chunk)
+        if size > limit:
+            raise too_large
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+# Respuestas de análisis: se validan una vez y se serializan con el
+# serializador de pydantic (Rust), sin jsonable_encoder + json.dumps
+_ANALYZE_RESPONSE_LIST = TypeAdapter(List[AnalyzeResponse])
+
+
+def _json_response(body) -> Response:
+    return Response(content=body, media_type="application/json")
+
+
+# Límite de análisis simultáneos (un semáforo por event loop)
+_inference_slots = None
+_inference_slots_loop = None
+
+
+def _inference_semaphore() -> asyncio.Semaphore:
+    global _inference_slots, _inference_slots_loop
+    loop = asyncio.get_running_loop()
+    if _inference_slots_loop is not loop:
+        _inference_slots = asyncio.Semaphore(settings.MAX_CONCURRENT_INFERENCE)
+        _inference_slots_loop = loop
+    return _inference_slots
+
+
+def _analyze_image(img, file_bytes: bytes, confidence: float, return_image: bool) -> dict:
+    """
+    Decodifica (si la validación no devolvió la imagen), ejecuta YOLO y
+    codifica la imagen anotada. Es trabajo de CPU: los endpoints async lo
+    llaman con run_in_threadpool para no bloquear el event loop.
+    """
+    if img is None:  # veredicto servido desde la caché de validación
+        img = pil_from_upload(file_bytes)
+    # img no se reutiliza: sin detecciones se devuelve sin copiarla
+    annotated, payload = run_inference(img, confidence, copy=False)
+    if return_image:
+        payload["image_base64"] = img_to_base64_jpeg(annotated)
+    return payload
+
+
+async def _run_analysis(img, file_bytes: bytes, confidence: float, return_image: bool) -> dict:
+    """
+    Igual que _analyze_image, pero YOLO pasa por la cola de inferencia
+    (app/batcher.py) y se agrupa con las peticiones concurrentes
+    """
+    if not settings.ENABLE_INFERENCE_BATCHER:
+        async with _inference_semaphore():
+            return await run_in_threadpool(
+                _analyze_image, img, file_bytes, confidence, return_image
+            )
+    
+    if img is None:  # veredicto servido desde la caché de validación
+        img = await run_in_threadpool(pil_from_upload, file_bytes)
+    annotated, payload = await inference_batcher.submit(img, confidence, copy=False)
+    if return_image:
+        payload["image_base64"] = await run_in_threadpool(img_to_base64_jpeg, annotated)
+    return payload
+
+
+def _analyze_batch(images: list, confidence: float, return_image: bool) -> list:
+    """Inferencia por lotes + codificación (se llama en el threadpool)"""
+    payloads = []
+    for annotated, payload in run_inference_batch(images, confidence):
+        if return_image:
+            payload["image_base64"] = img_to_base64_jpeg(annotated)
+        payloads.append(payload)
+    return payloads
+
+
 def build_teeth_fdi_from_detections(detections):
     """
     Intenta construir un dict { clase: [FDI...] } a partir de detections.
     Busca keys típicas: 'tooth_fdi', 'tooth', 'fdi'.
     """
+    # dict por clase como conjunto ordenado: deduplica en O(1) y conserva
+    # el orden de aparición (los FDI pueden quedar como str si no son int)
     result = {
-        "Caries": [],
-        "Diente_Retenido": [],
-        "Perdida_Osea": [],
+        "Caries": {},
+        "Diente_Retenido": {},
+        "Perdida_Osea": {},
     }
     if not detections:
-        return result
+        return {cls: [] for cls in result}
 
     for d in detections:
         cls = d.get("class_name") or d.get("cls_name")
@@ -55,11 +160,9 @@ def build_teeth_fdi_from_detections(detections):
         except Exception:
             tooth_int = tooth
 
-        result.setdefault(cls, [])
-        if tooth_int not in result[cls]:
-            result[cls].append(tooth_int)
+        result.setdefault(cls, {})[tooth_int] = None
 
-    return result
+    return {cls: list(teeth) for cls, teeth in result.items()}
 
 
 # -------------------------------------------------------------------
@@ -84,6 +187,71 @@ def metadata():
     return {"classes": classes, "default_conf_threshold": settings.DEFAULT_CONFIDENCE}
 
 
+def _save_analysis(
+    db: Session, user_id: int, filename: Optional[str], confidence: float,
+    payload: dict, response: AnalyzeResponse,
+):
+    """
+    Guarda el análisis de /analyze (save=true). Síncrono: se ejecuta en el
+    threadpool. La imagen anotada se escribe en disco antes del commit; si
+    el commit falla se hace rollback y se borra el archivo (sin huérfanos)
+    """
+    detections = payload.get("detections", []) or []
+
+    # conteo por clase en una sola pasada
+    class_counts = Counter(d.get("class_name") for d in detections)
+
+    # índice por usuario (1,2,3...) solo dentro de esa cuenta: el
+    # contador se incrementa en la misma transacción que el INSERT, así
+    # dos guardados simultáneos nunca reciben el mismo índice
+    next_idx = db.execute(
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(analysis_counter=models.User.analysis_counter + 1)
+        .returning(models.User.analysis_counter)
+    ).scalar_one()
+
+    # mapa de dientes FDI
+    teeth_map = (
+        payload.get("teeth_fdi")
+        or payload.get("teeth_fdi_map")
+        or build_teeth_fdi_from_detections(detections)
+    )
+
+    row = models.Analysis(
+        user_id=user_id,
+        per_user_index=next_idx,
+        image_filename=(filename or "")[:128] or None,  # cabe en String(128)
+        model_used=str(payload.get("model", "best.pt")),
+        confidence=confidence,
+        total_detections=len(detections),
+        caries_count=class_counts["Caries"],
+        diente_retenido_count=class_counts["Diente_Retenido"],
+        perdida_osea_count=class_counts["Perdida_Osea"],
+        # sin la imagen: va a disco (image_key), no dentro de la fila
+        results_json=response.model_dump_json(exclude={"image_base64"}),
+        teeth_fdi_json=json.dumps(teeth_map, ensure_ascii=False),
+        report_text=(
+            (payload.get("summary") or {}).get("text")
+            if isinstance(payload.get("summary"), dict)
+            else None
+        ),
+    )
+    db.add(row)
+    key = None
+    try:
+        # La imagen va a disco con el id del análisis; la fila solo guarda la clave
+        if payload.get("image_base64"):
+            db.flush()
+            key = save_image_base64(user_id, row.id, payload["image_base64"])
+            row.image_key = key
+        db.commit()
+    except Exception:
+        db.rollback()
+        delete_image(key)
+        raise
+
+
 # -------------------------------------------------------------------
 # ANALYZE (requiere login) + guarda en BD si save=true
 # -------------------------------------------------------------------
@@ -104,13 +272,13 @@ async def analyze(
         )
     
     # Leer archivo
-    file_bytes = await file.read()
+    file_bytes = await _read_upload(file)
     
     # VALIDACIÓN 2: Validación completa de imagen radiográfica
     print(f"[IMAGE] Validando archivo: {file.filename}")
-    is_valid, error_msg, validation_details = validate_dental_xray(
-        file_bytes, 
-        file.filename
+    # Devuelve también la imagen decodificada (se reutiliza para YOLO)
+    is_valid, error_msg, validation_details, img = await run_in_threadpool(
+        validate_and_load_xray, file_bytes, file.filename
     )
     
     if not is_valid:
@@ -123,62 +291,23 @@ async def analyze(
     print(f"[IMAGE] ✅ Imagen válida (X-ray: {validation_details['xray_confidence']:.1f}%, Panoramic: {validation_details['panoramic_confidence']:.1f}%)")
     
     # Si llega aquí, la imagen es válida
-    # Continuar con análisis YOLO normal
-    img = pil_from_upload(file_bytes)
-    annotated, payload = run_inference(img, confidence)
+    # Continuar con análisis YOLO normal (fuera del event loop)
+    payload = await _run_analysis(img, file_bytes, confidence, return_image)
 
-    detections = payload.get("detections", []) or []
-
-    if return_image:
-        payload["image_base64"] = img_to_base64_png(annotated)
+    # Validación una sola vez: el mismo modelo da el JSON de la respuesta
+    # y el de results_json
+    response = AnalyzeResponse(**payload)
+    response_json = response.model_dump_json()
 
     # ----------------------------------------------------------------
-    # Guardado opcional del análisis
+    # Guardado opcional del análisis (SQL + escritura a disco: threadpool)
     # ----------------------------------------------------------------
     if save:
-
-        def _count(cls_name: str) -> int:
-            return sum(1 for d in detections if d.get("class_name") == cls_name)
-
-        # índice por usuario (1,2,3...) solo dentro de esa cuenta
-        last_idx_row = (
-            db.query(models.Analysis.per_user_index)
-            .filter(models.Analysis.user_id == user.id)
-            .order_by(models.Analysis.per_user_index.desc())
-            .first()
+        await run_in_threadpool(
+            _save_analysis, db, user.id, file.filename, confidence, payload, response
         )
-        next_idx = (last_idx_row[0] if last_idx_row and last_idx_row[0] else 0) + 1
 
-        # mapa de dientes FDI
-        teeth_map = (
-            payload.get("teeth_fdi")
-            or payload.get("teeth_fdi_map")
-            or build_teeth_fdi_from_detections(detections)
-        )
-
-        row = models.Analysis(
-            user_id=user.id,
-            per_user_index=next_idx,
-            image_filename=file.filename,
-            image_base64=payload.get("image_base64"),
-            model_used=str(payload.get("model", "best.pt")),
-            confidence=confidence,
-            total_detections=len(detections),
-            caries_count=_count("Caries"),
-            diente_retenido_count=_count("Diente_Retenido"),
-            perdida_osea_count=_count("Perdida_Osea"),
-            results_json=AnalyzeResponse(**payload).model_dump_json(),
-            teeth_fdi_json=json.dumps(teeth_map, ensure_ascii=False),
-            report_text=(
-                (payload.get("summary") or {}).get("text")
-                if isinstance(payload.get("summary"), dict)
-                else None
-            ),
-        )
-        db.add(row)
-        db.commit()
-
-    return JSONResponse(content=AnalyzeResponse(**payload).model_dump())
+    return _json_response(response_json)
 
 
 # -------------------------------------------------------------------
@@ -198,13 +327,13 @@ async def analyze_public(
         )
     
     # Leer archivo
-    file_bytes = await file.read()
+    file_bytes = await _read_upload(file)
     
     # VALIDACIÓN 2: Validación completa de imagen radiográfica
     print(f"[IMAGE] Validando archivo: {file.filename}")
-    is_valid, error_msg, validation_details = validate_dental_xray(
-        file_bytes, 
-        file.filename
+    # Devuelve también la imagen decodificada (se reutiliza para YOLO)
+    is_valid, error_msg, validation_details, img = await run_in_threadpool(
+        validate_and_load_xray, file_bytes, file.filename
     )
     
     if not is_valid:
@@ -216,29 +345,77 @@ async def analyze_public(
     
     print(f"[IMAGE] ✅ Imagen válida")
     
-    # Continuar con análisis YOLO
-    img = pil_from_upload(file_bytes)
-    annotated, payload = run_inference(img, confidence)
-    if return_image:
-        payload["image_base64"] = img_to_base64_png(annotated)
-    return AnalyzeResponse(**payload)
+    # Continuar con análisis YOLO (fuera del event loop)
+    payload = await _run_analysis(img, file_bytes, confidence, return_image)
+    return _json_response(AnalyzeResponse(**payload).model_dump_json())
+
+
+# -------------------------------------------------------------------
+# ANALYZE PÚBLICO POR LOTES (varias imágenes, una sola pasada de YOLO)
+# -------------------------------------------------------------------
+@router.post("/analyze-public-batch", response_model=List[AnalyzeResponse], tags=["analyze"])
+async def analyze_public_batch(
+    files: List[UploadFile] = File(...),
+    confidence: float = Form(settings.DEFAULT_CONFIDENCE),
+    return_image: bool = Form(False),
+):
+    if len(files) > settings.MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Máximo {settings.MAX_BATCH_SIZE} imágenes por lote"
+        )
+    
+    # Todas las imágenes se validan antes de la inferencia: una inválida
+    # rechaza el lote indicando qué archivo falló
+    images = []
+    for file in files:
+        if not file.content_type or not file.content_type.startswith("image/"):
+            raise HTTPException(
+                status_code=400,
+                detail=f"{file.filename}: Se requiere un archivo de imagen (JPG, PNG, etc.)"
+            )
+        
+        file_bytes = await _read_upload(file)
+        is_valid, error_msg, _, img = await run_in_threadpool(
+            validate_and_load_xray, file_bytes, file.filename
+        )
+        if not is_valid:
+            print(f"[IMAGE] ❌ Imagen rechazada ({file.filename}): {error_msg}")
+            raise HTTPException(
+                status_code=400,
+                detail=f"{file.filename}: {error_msg}"
+            )
+        
+        if img is None:  # veredicto servido desde la caché de validación
+            img = await run_in_threadpool(pil_from_upload, file_bytes)
+        images.append(img)
+    
+    async with _inference_semaphore():
+        payloads = await run_in_threadpool(_analyze_batch, images, confidence, return_image)
+    return _json_response(
+        _ANALYZE_RESPONSE_LIST.dump_json(_ANALYZE_RESPONSE_LIST.validate_python(payloads))
+    )
 
 
 # -------------------------------------------------------------------
 # ANALYZE DESDE URL (público)
 # -------------------------------------------------------------------
 @router.post("/analyze-url", response_model=AnalyzeResponse, tags=["analyze"])
-def analyze_url(req: AnalyzeUrlRequest):
+async def analyze_url(req: AnalyzeUrlRequest):
     """
     NOTA: Este endpoint NO valida si es radiografía panorámica
     porque la imagen viene de URL externa sin acceso al archivo original.
     Se recomienda usar /analyze o /analyze-public para validación completa.
     """
-    img = pil_from_url(str(req.url))
-    annotated, payload = run_inference(img, req.confidence)
-    if req.return_image:
-        payload["image_base64"] = img_to_base64_png(annotated)
-    return AnalyzeResponse(**payload)
+    try:
+        file_bytes = await bytes_from_url(str(req.url), settings.MAX_UPLOAD_BYTES)
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=400, detail=f"No se pudo descargar la imagen: {e}")
+    # La decodificación ocurre en el threadpool, junto con YOLO
+    payload = await _run_analysis(None, file_bytes, req.confidence, req.return_image)
+    return _json_response(AnalyzeResponse(**payload).model_dump_json())
 
 
 # -------------------------------------------------------------------
@@ -246,13 +423,25 @@ def analyze_url(req: AnalyzeUrlRequest):
 # -------------------------------------------------------------------
 @router.get("/analyses", tags=["history"])
 def list_analyses(
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
     db: Session = Depends(get_db),
     user: models.User = Depends(get_current_user),
 ):
+    # Paginado y solo las columnas del listado: las imágenes, results_json
+    # y report_text no se leen (la imagen se pide aparte por image_url)
+    A = models.Analysis
     rows = (
-        db.query(models.Analysis)
-        .filter(models.Analysis.user_id == user.id)
-        .order_by(models.Analysis.created_at.desc())
+        db.query(
+            A.id, A.per_user_index, A.created_at, A.image_filename, A.model_used,
+            A.total_detections, A.caries_count, A.diente_retenido_count,
+            A.perdida_osea_count, A.teeth_fdi_json,
+            or_(A.image_key.isnot(None), A.image_base64.isnot(None)).label("has_image"),
+        )
+        .filter(A.user_id == user.id)
+        .order_by(A.created_at.desc())
+        .limit(limit)
+        .offset(offset)
         .all()
     )
 
@@ -297,7 +486,8 @@ def list_analyses(
                 "total": r.total_detections,
                 "osea": r.perdida_osea_count,
                 "teeth_fdi": teeth_map,
-                "image_base64": r.image_base64,
+                # imagen anotada: se descarga aparte (GET /analyses/{id}/image)
+                "image_url": f"/analyses/{r.id}/image" if r.has_image else None,
             }
         )
 
@@ -320,12 +510,83 @@ def delete_analysis(
 
     db.delete(r)
     db.commit()
+    delete_image(r.image_key)
     return {"deleted": analysis_id}
 
 
+@router.get("/analyses/{analysis_id}/image", tags=["history"])
+def get_analysis_image(
+    analysis_id: int,
+    db: Session = Depends(get_db),
+    user: models.User = Depends(get_current_user),
+):
+    r = (
+        db.query(models.Analysis.image_key, models.Analysis.image_base64)
+        .filter(models.Analysis.id == analysis_id, models.Analysis.user_id == user.id)
+        .first()
+    )
+    if not r:
+        raise HTTPException(404, "No encontrado")
+
+    if r.image_key:
+        path = image_path(r.image_key)
+        if path.is_file():
+            return FileResponse(path, media_type="image/jpeg")
+    elif r.image_base64:
+        # análisis antiguos: JPEG o PNG en base64 dentro de la fila
+        data = base64.b64decode(r.image_base64)
+        media_type = "image/png" if data.startswith(b"\x89PNG") else "image/jpeg"
+        return Response(content=data, media_type=media_type)
+
+    raise HTTPException(404, "Imagen no disponible")
+
+
 # ═══════════════════════════════════════════════════════════════════════════
 #  Información sobre dientes FDI
 # ═══════════════════════════════════════════════════════════════════════════
+# Tablas FDI (constantes: se arman una vez al importar)
+_QUADRANT_NAMES = {
+    1: "Superior Derecho",
+    2: "Superior Izquierdo",
+    3: "Inferior Izquierdo",
+    4: "Inferior Derecho"
+}
+
+_TOOTH_NAMES = {
+    1: "Incisivo Central",
+    2: "Incisivo Lateral",
+    3: "Canino",
+    4: "Primer Premolar",
+    5: "Segundo Premolar",
+    6: "Primer Molar",
+    7: "Segundo Molar",
+    8: "Tercer Molar (Muela del Juicio)"
+}
+
+
+def _fdi_info(fdi_number: int) -> dict:
+    quadrant = fdi_number // 10
+    position = fdi_number % 10
+    quadrant_name = _QUADRANT_NAMES[quadrant]
+    tooth_name = _TOOTH_NAMES[position]
+    return {
+        "fdi": fdi_number,
+        "quadrant": quadrant,
+        "quadrant_name": quadrant_name,
+        "position": position,
+        "tooth_name": tooth_name,
+        "tooth_type": "Permanente",  # 11-48: solo dentición permanente
+        "full_name": f"{tooth_name} {quadrant_name}",
+        "description": f"Diente {fdi_number} - {tooth_name} del cuadrante {quadrant_name}"
+    }
+
+
+# Respuesta de /fdi-info para cada número válido (11-18, 21-28, 31-38, 41-48)
+_FDI_INFO = {
+    q * 10 + p: _fdi_info(q * 10 + p) for q in _QUADRANT_NAMES for p in _TOOTH_NAMES
+}
+
+
 @router.get("/fdi-info/{fdi_number}", tags=["info"])
 def get_fdi_info(fdi_number: int):
     """
@@ -337,249 +598,201 @@ def get_fdi_info(fdi_number: int):
     Returns:
         Información del diente (cuadrante, posición, nombre)
     """
-    if fdi_number < 11 or fdi_number > 48 or fdi_number % 10 == 0 or fdi_number % 10 > 8:
+    info = _FDI_INFO.get(fdi_number)
+    if info is None:
         raise HTTPException(400, "Número FDI inválido. Debe ser 11-18, 21-28, 31-38 o 41-48")
-    
-    quadrant = fdi_number // 10
-    position = fdi_number % 10
-    
-    quadrant_names = {
-        1: "Superior Derecho",
-        2: "Superior Izquierdo",
-        3: "Inferior Izquierdo",
-        4: "Inferior Derecho"
-    }
-    
-    tooth_names = {
-        1: "Incisivo Central",
-        2: "Incisivo Lateral",
-        3: "Canino",
-        4: "Primer Premolar",
-        5: "Segundo Premolar",
-        6: "Primer Molar",
-        7: "Segundo Molar",
-        8: "Tercer Molar (Muela del Juicio)"
-    }
-    
-    tooth_type = "Permanente"
-    if quadrant in [5, 6, 7, 8]:
-        tooth_type = "Temporal (Deciduo)"
-    
-    return {
-        "fdi": fdi_number,
-        "quadrant": quadrant,
-        "quadrant_name": quadrant_names.get(quadrant, "Desconocido"),
-        "position": position,
-        "tooth_name": tooth_names.get(position, "Desconocido"),
-        "tooth_type": tooth_type,
-        "full_name": f"{tooth_names.get(position, 'Desconocido')} {quadrant_names.get(quadrant, 'Desconocido')}",
-        "description": f"Diente {fdi_number} - {tooth_names.get(position)} del cuadrante {quadrant_names.get(quadrant)}"
-    }
+    return info
 
 
 # ═══════════════════════════════════════════════════════════════════════════
 #  Mapa completo de dientes FDI
 # ═══════════════════════════════════════════════════════════════════════════
+_FDI_MAP = {
+    "quadrants": {
+        q: {"name": name, "teeth": list(range(q * 10 + 1, q * 10 + 9))}
+        for q, name in _QUADRANT_NAMES.items()
+    },
+    "tooth_positions": {**_TOOTH_NAMES, 8: "Tercer Molar"},
+    "total_permanent_teeth": 32,
+    "description": "Sistema FDI de numeración dental internacional"
+}
+
+
 @router.get("/fdi-map", tags=["info"])
 def get_fdi_map():
     """
     Retorna el mapa completo de la numeración FDI.
     """
-    quadrants = {
-        1: {"name": "Superior Derecho", "teeth": list(range(11, 19))},
-        2: {"name": "Superior Izquierdo", "teeth": list(range(21, 29))},
-        3: {"name": "Inferior Izquierdo", "teeth": list(range(31, 39))},
-        4: {"name": "Inferior Derecho", "teeth": list(range(41, 49))},
-    }
-    
-    tooth_names = {
-        1: "Incisivo Central",
-        2: "Incisivo Lateral",
-        3: "Canino",
-        4: "Primer Premolar",
-        5: "Segundo Premolar",
-        6: "Primer Molar",
-        7: "Segundo Molar",
-        8: "Tercer Molar"
-    }
-    
-    return {
-        "quadrants": quadrants,
-        "tooth_positions": tooth_names,
-        "total_permanent_teeth": 32,
-        "description": "Sistema FDI de numeración dental internacional"
-    }
+    return _FDI_MAP
 
 # ═══════════════════════════════════════════════════════════════════════════
 # GESTIÓN Y COMPARACIÓN DE MODELOS
 # ═══════════════════════════════════════════════════════════════════════════
 
-@router.get("/models/available", tags=["models"])
-def list_available_models():
-    """
-    Retorna lista de modelos disponibles con métricas completas
-    """
-    models_data = [
-        {
-            "id": "best",
-            "name": "best.pt",
-            "architecture": "YOLOv8n/s",
-            "version": "v8",
-            "epochs": 100,
-            "status": "production",
-            "is_active": True,
-            "metrics": {
-                "map50": 0.790,
-                "map50_95": 0.520,
-                "precision": 0.790,
-                "recall": 0.750
-            },
-            "per_class_metrics": {
-                "Caries": {"precision": 0.82, "recall": 0.78, "map50": 0.80},
-                "Diente_Retenido": {"precision": 0.75, "recall": 0.85, "map50": 0.82},
-                "Perdida_Osea": {"precision": 0.80, "recall": 0.62, "map50": 0.75}
-            },
-            "training_info": {
-                "duration_hours": 2.5,
-                "train_images": 19308,
-                "val_images": 2725,
-                "date": "2025-10"
-            },
-            "description": "Modelo principal en producción. Mejor equilibrio entre precisión y velocidad."
+# Catálogo estático de modelos: la respuesta se arma una vez al importar
+_MODELS_DATA = [
+    {
+        "id": "best",
+        "name": "best.pt",
+        "architecture": "YOLOv8n/s",
+        "version": "v8",
+        "epochs": 100,
+        "status": "production",
+        "is_active": True,
+        "metrics": {
+            "map50": 0.790,
+            "map50_95": 0.520,
+            "precision": 0.790,
+            "recall": 0.750
         },
-        {
-            "id": "yolov11m",
-            "name": "yolov11m_best.pt",
-            "architecture": "YOLOv11m",
-            "version": "v11",
-            "epochs": 40,
-            "status": "experimental",
-            "is_active": False,
-            "metrics": {
-                "map50": 0.581,
-                "map50_95": 0.365,
-                "precision": 0.554,
-                "recall": 0.590
-            },
-            "per_class_metrics": {
-                "Caries": {"precision": 0.596, "recall": 0.550, "map50": 0.562},
-                "Diente_Retenido": {"precision": 0.530, "recall": 0.947, "map50": 0.824},
-                "Perdida_Osea": {"precision": 0.534, "recall": 0.273, "map50": 0.356}
-            },
-            "training_info": {
-                "duration_hours": 2.62,
-                "train_images": 19308,
-                "val_images": 2725,
-                "early_stopping": 28,
-                "date": "2025-11"
-            },
-            "description": "Versión 11 Medium. Early stopping en epoch 28. Excelente recall en dientes retenidos."
+        "per_class_metrics": {
+            "Caries": {"precision": 0.82, "recall": 0.78, "map50": 0.80},
+            "Diente_Retenido": {"precision": 0.75, "recall": 0.85, "map50": 0.82},
+            "Perdida_Osea": {"precision": 0.80, "recall": 0.62, "map50": 0.75}
         },
-        {
-            "id": "yolov11l",
-            "name": "yolov11l_best.pt",
-            "architecture": "YOLOv11l",
-            "version": "v11",
-            "epochs": 40,
-            "status": "experimental",
-            "is_active": False,
-            "metrics": {
-                "map50": 0.575,
-                "map50_95": 0.367,
-                "precision": 0.543,
-                "recall": 0.590
-            },
-            "per_class_metrics": {
-                "Caries": {"precision": 0.624, "recall": 0.539, "map50": 0.568},
-                "Diente_Retenido": {"precision": 0.548, "recall": 0.944, "map50": 0.818},
-                "Perdida_Osea": {"precision": 0.458, "recall": 0.287, "map50": 0.338}
-            },
-            "training_info": {
-                "duration_hours": 5.68,
-                "train_images": 19308,
-                "val_images": 2725,
-                "date": "2025-11"
-            },
-            "description": "Modelo Large v11. Mejor precisión en caries pero entrenamiento más lento."
+        "training_info": {
+            "duration_hours": 2.5,
+            "train_images": 19308,
+            "val_images": 2725,
+            "date": "2025-10"
         },
-        {
-            "id": "yolov10m",
-            "name": "yolov10m_best.pt",
-            "architecture": "YOLOv10m",
-            "version": "v10",
-            "epochs": 40,
-            "status": "experimental",
-            "is_active": False,
-            "metrics": {
-                "map50": 0.513,
-                "map50_95": 0.315,
-                "precision": 0.445,
-                "recall": 0.547
-            },
-            "per_class_metrics": {
-                "Caries": {"precision": 0.561, "recall": 0.450, "map50": 0.475},
-                "Diente_Retenido": {"precision": 0.456, "recall": 0.940, "map50": 0.795},
-                "Perdida_Osea": {"precision": 0.319, "recall": 0.243, "map50": 0.269}
-            },
-            "training_info": {
-                "duration_hours": 2.37,
-                "train_images": 19308,
-                "val_images": 2725,
-                "date": "2025-11"
-            },
-            "description": "Modelo v10 Medium. Menor rendimiento general pero rápido."
+        "description": "Modelo principal en producción. Mejor equilibrio entre precisión y velocidad."
+    },
+    {
+        "id": "yolov11m",
+        "name": "yolov11m_best.pt",
+        "architecture": "YOLOv11m",
+        "version": "v11",
+        "epochs": 40,
+        "status": "experimental",
+        "is_active": False,
+        "metrics": {
+            "map50": 0.581,
+            "map50_95": 0.365,
+            "precision": 0.554,
+            "recall": 0.590
         },
-        {
-            "id": "yolov8x",
-            "name": "yolov8x_best.pt",
-            "architecture": "YOLOv8x",
-            "version": "v8",
-            "epochs": 28,
-            "status": "incomplete",
-            "is_active": False,
-            "metrics": {
-                "map50": 0.562,
-                "map50_95": 0.345,
-                "precision": 0.537,
-                "recall": 0.567
-            },
-            "per_class_metrics": {
-                "Caries": {"precision": 0.58, "recall": 0.52, "map50": 0.55},
-                "Diente_Retenido": {"precision": 0.52, "recall": 0.89, "map50": 0.78},
-                "Perdida_Osea": {"precision": 0.51, "recall": 0.29, "map50": 0.36}
-            },
-            "training_info": {
-                "duration_hours": 3.0,
-                "train_images": 19308,
-                "val_images": 2725,
-                "interrupted": True,
-                "target_epochs": 50,
-                "date": "2025-11"
-            },
-            "description": " Entrenamiento interrumpido en epoch 28/50. No usar en producción."
-        }
-    ]
-    
-    return {
-        "models": models_data,
-        "total": len(models_data),
-        "active_model": next((m["id"] for m in models_data if m["is_active"]), "best")
+        "per_class_metrics": {
+            "Caries": {"precision": 0.596, "recall": 0.550, "map50": 0.562},
+            "Diente_Retenido": {"precision": 0.530, "recall": 0.947, "map50": 0.824},
+            "Perdida_Osea": {"precision": 0.534, "recall": 0.273, "map50": 0.356}
+        },
+        "training_info": {
+            "duration_hours": 2.62,
+            "train_images": 19308,
+            "val_images": 2725,
+            "early_stopping": 28,
+            "date": "2025-11"
+        },
+        "description": "Versión 11 Medium. Early stopping en epoch 28. Excelente recall en dientes retenidos."
+    },
+    {
+        "id": "yolov11l",
+        "name": "yolov11l_best.pt",
+        "architecture": "YOLOv11l",
+        "version": "v11",
+        "epochs": 40,
+        "status": "experimental",
+        "is_active": False,
+        "metrics": {
+            "map50": 0.575,
+            "map50_95": 0.367,
+            "precision": 0.543,
+            "recall": 0.590
+        },
+        "per_class_metrics": {
+            "Caries": {"precision": 0.624, "recall": 0.539, "map50": 0.568},
+            "Diente_Retenido": {"precision": 0.548, "recall": 0.944, "map50": 0.818},
+            "Perdida_Osea": {"precision": 0.458, "recall": 0.287, "map50": 0.338}
+        },
+        "training_info": {
+            "duration_hours": 5.68,
+            "train_images": 19308,
+            "val_images": 2725,
+            "date": "2025-11"
+        },
+        "description": "Modelo Large v11. Mejor precisión en caries pero entrenamiento más lento."
+    },
+    {
+        "id": "yolov10m",
+        "name": "yolov10m_best.pt",
+        "architecture": "YOLOv10m",
+        "version": "v10",
+        "epochs": 40,
+        "status": "experimental",
+        "is_active": False,
+        "metrics": {
+            "map50": 0.513,
+            "map50_95": 0.315,
+            "precision": 0.445,
+            "recall": 0.547
+        },
+        "per_class_metrics": {
+            "Caries": {"precision": 0.561, "recall": 0.450, "map50": 0.475},
+            "Diente_Retenido": {"precision": 0.456, "recall": 0.940, "map50": 0.795},
+            "Perdida_Osea": {"precision": 0.319, "recall": 0.243, "map50": 0.269}
+        },
+        "training_info": {
+            "duration_hours": 2.37,
+            "train_images": 19308,
+            "val_images": 2725,
+            "date": "2025-11"
+        },
+        "description": "Modelo v10 Medium. Menor rendimiento general pero rápido."
+    },
+    {
+        "id": "yolov8x",
+        "name": "yolov8x_best.pt",
+        "architecture": "YOLOv8x",
+        "version": "v8",
+        "epochs": 28,
+        "status": "incomplete",
+        "is_active": False,
+        "metrics": {
+            "map50": 0.562,
+            "map50_95": 0.345,
+            "precision": 0.537,
+            "recall": 0.567
+        },
+        "per_class_metrics": {
+            "Caries": {"precision": 0.58, "recall": 0.52, "map50": 0.55},
+            "Diente_Retenido": {"precision": 0.52, "recall": 0.89, "map50": 0.78},
+            "Perdida_Osea": {"precision": 0.51, "recall": 0.29, "map50": 0.36}
+        },
+        "training_info": {
+            "duration_hours": 3.0,
+            "train_images": 19308,
+            "val_images": 2725,
+            "interrupted": True,
+            "target_epochs": 50,
+            "date": "2025-11"
+        },
+        "description": " Entrenamiento interrumpido en epoch 28/50. No usar en producción."
     }
+]
 
+_MODELS_RESPONSE = {
+    "models": _MODELS_DATA,
+    "total": len(_MODELS_DATA),
+    "active_model": next((m["id"] for m in _MODELS_DATA if m["is_active"]), "best")
+}
 
-@router.get("/models/comparison", tags=["models"])
-def get_models_comparison():
+
+@router.get("/models/available", tags=["models"])
+def list_available_models():
     """
-    Retorna tabla comparativa de modelos
+    Retorna lista de modelos disponibles con métricas completas
     """
-    models = list_available_models()["models"]
-    
+    return _MODELS_RESPONSE
+
+
+def _build_models_comparison() -> dict:
     comparison = {
         "headers": ["Modelo", "Arquitectura", "mAP50", "mAP50-95", "Precision", "Recall", "Tiempo (h)", "Estado"],
         "rows": []
     }
     
-    for model in models:
+    for model in _MODELS_DATA:
         row = {
             "id": model["id"],
             "name": model["name"],
@@ -600,6 +813,17 @@ def get_models_comparison():
     return comparison
 
 
+_MODELS_COMPARISON = _build_models_comparison()
+
+
+@router.get("/models/comparison", tags=["models"])
+def get_models_comparison():
+    """
+    Retorna tabla comparativa de modelos
+    """
+    return _MODELS_COMPARISON
+
+
 @router.post("/models/set-active/{model_id}", tags=["models"])
 def set_active_model(model_id: str, user: models.User = Depends(get_current_user)):
     """
@@ -10,10 +10,38 @@ class Settings(BaseSettings):
     # ═══════════════════════════════════════════════════════════════════
     MODEL_URL: Optional[AnyHttpUrl] = None
     MODEL_LOCAL_PATH: str = os.getenv("MODEL_LOCAL_PATH", "models/best.pt")
+    # SHA-256 esperado del modelo descargado (opcional)
+    MODEL_SHA256: Optional[str] = os.getenv("MODEL_SHA256")
+    # Al arrancar con el .pt ya descargado, consultar MODEL_URL con su ETag
+    # (petición condicional) y bajar el modelo solo si cambió
+    MODEL_REVALIDATE: bool = os.getenv("MODEL_REVALIDATE", "false").lower() == "true"
     DEFAULT_CONFIDENCE: float = float(os.getenv("DEFAULT_CONFIDENCE", "0.25"))
     
     # OPTIMIZACIÓN: Cachear modelo en memoria (no recargar)
     MODEL_CACHE_ENABLED: bool = True
+    # Backend de inferencia: "pytorch" (.pt), "onnx" (ONNX Runtime),
+    # "engine" (TensorRT FP16) o "auto" (engine con CUDA, onnx en CPU).
+    # Se exporta una vez junto al .pt
+    MODEL_BACKEND: str = os.getenv("MODEL_BACKEND", "pytorch").lower()
+    MODEL_IMGSZ: int = int(os.getenv("MODEL_IMGSZ", "640"))
+    # Reducir en CPU las imágenes más grandes que MODEL_IMGSZ antes de
+    # model.predict (las cajas se reescalan al tamaño original)
+    PREDICT_DOWNSCALE: bool = os.getenv("PREDICT_DOWNSCALE", "true").lower() == "true"
+    # Máximo de imágenes por llamada batch a model.predict
+    MAX_BATCH_SIZE: int = int(os.getenv("MAX_BATCH_SIZE", "8"))
+    # Cola de inferencia: las peticiones concurrentes de /analyze se
+    # agrupan en un lote si llegan dentro de BATCH_WINDOW_MS. Pensada
+    # para GPU; en CPU un lote de imágenes con distinta proporción se
+    # rellena a cuadrado y resulta más lento que predecir una por una
+    ENABLE_INFERENCE_BATCHER: bool = os.getenv("ENABLE_INFERENCE_BATCHER", "false").lower() == "true"
+    BATCH_WINDOW_MS: int = int(os.getenv("BATCH_WINDOW_MS", "10"))
+    # Análisis en curso a la vez por proceso (los demás esperan en el
+    # event loop sin ocupar hilos del threadpool)
+    MAX_CONCURRENT_INFERENCE: int = int(os.getenv("MAX_CONCURRENT_INFERENCE", "2"))
+    # Hilos intra-op de torch por proceso (0 = núcleos / WEB_CONCURRENCY):
+    # con varios workers uvicorn cada uno usaría todos los núcleos
+    TORCH_NUM_THREADS: int = int(os.getenv("TORCH_NUM_THREADS", "0"))
+    WEB_CONCURRENCY: int = int(os.getenv("WEB_CONCURRENCY", "1"))
 
     # ═══════════════════════════════════════════════════════════════════
     # CONFIGURACIÓN DE CORS
@@ -25,11 +53,16 @@ class Settings(BaseSettings):
     # ═══════════════════════════════════════════════════════════════════
     SAVE_OUTPUTS: bool = os.getenv("SAVE_OUTPUTS", "false").lower() == "true"
     OUTPUT_BUCKET: Optional[str] = os.getenv("OUTPUT_BUCKET")
+    # Imágenes anotadas del historial: {IMAGE_DIR}/{user_id}/{analysis_id}.jpg
+    # (la fila solo guarda la clave relativa)
+    IMAGE_DIR: str = os.getenv("IMAGE_DIR", "data/images")
 
     # ═══════════════════════════════════════════════════════════════════
     # CONFIGURACIÓN DE LA APP
     # ═══════════════════════════════════════════════════════════════════
     APP_VERSION: str = os.getenv("APP_VERSION", "1.0.0")
+    # Habilita endpoints de diagnóstico (p. ej. /auth/performance-test)
+    DEBUG: bool = os.getenv("DEBUG", "false").lower() == "true"
 
     # ═══════════════════════════════════════════════════════════════════
     # CONFIGURACIÓN JWT (OPTIMIZADA)
@@ -38,10 +71,16 @@ class Settings(BaseSettings):
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "1440"))
 
+    # OPTIMIZACIÓN: Caché de tokens verificados (evita jwt.decode + query)
+    AUTH_CACHE_TTL_SECONDS: int = int(os.getenv("AUTH_CACHE_TTL_SECONDS", "30"))
+    AUTH_CACHE_MAX_ENTRIES: int = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+
     # ═══════════════════════════════════════════════════════════════════
     # OPTIMIZACIÓN: BCRYPT ROUNDS (menos rounds = más rápido)
     # ═══════════════════════════════════════════════════════════════════
     BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "8"))
+    # Fracción de operaciones bcrypt cuyo tiempo se registra (logger en DEBUG)
+    AUTH_TIMING_SAMPLE_RATE: float = float(os.getenv("AUTH_TIMING_SAMPLE_RATE", "0.01"))
     
     # ═══════════════════════════════════════════════════════════════════
     # OPTIMIZACIÓN: DATABASE
@@ -54,11 +93,22 @@ class Settings(BaseSettings):
     # ═══════════════════════════════════════════════════════════════════
     ENABLE_RESULT_CACHE: bool = os.getenv("ENABLE_RESULT_CACHE", "true").lower() == "true"
     CACHE_TTL_SECONDS: int = int(os.getenv("CACHE_TTL_SECONDS", "300"))
+    # Límite del caché de resultados en MB de imagen anotada decodificada
+    # (una panorámica de 2900×1500 RGB ocupa ~13 MB)
+    CACHE_MAX_MB: int = int(os.getenv("CACHE_MAX_MB", "256"))
+    VALIDATION_CACHE_MAX_ENTRIES: int = int(os.getenv("VALIDATION_CACHE_MAX_ENTRIES", "256"))
+    # Caché persistente de inferencias en SQLite (sobrevive a reinicios).
+    # Desactivada por defecto: guarda la radiografía anotada de TODAS las
+    # peticiones (también las públicas, sin usuario) en dental.db
+    ENABLE_INFERENCE_CACHE: bool = os.getenv("ENABLE_INFERENCE_CACHE", "false").lower() == "true"
+    INFERENCE_CACHE_MAX_ENTRIES: int = int(os.getenv("INFERENCE_CACHE_MAX_ENTRIES", "200"))
     
     # ═══════════════════════════════════════════════════════════════════
     # OPTIMIZACIÓN: COMPRESIÓN DE IMÁGENES
     # ═══════════════════════════════════════════════════════════════════
     MAX_IMAGE_SIZE: int = int(os.getenv("MAX_IMAGE_SIZE", "2048"))
+    # Tamaño máximo del archivo subido (bytes): más grande → HTTP 413
+    MAX_UPLOAD_BYTES: int = int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
     IMAGE_QUALITY: int = int(os.getenv("IMAGE_QUALITY", "85"))
     
     # ═══════════════════════════════════════════════════════════════════
@@ -84,7 +134,7 @@ def print_optimization_settings():
     print(f"✓ Model cache enabled: {settings.MODEL_CACHE_ENABLED}")
     print(f"✓ Bcrypt rounds: {settings.BCRYPT_ROUNDS} (menor = más rápido)")
     print(f"✓ Result cache: {settings.ENABLE_RESULT_CACHE}")
-    print(f"✓ Cache TTL: {settings.CACHE_TTL_SECONDS}s")
+    print(f"✓ Cache TTL: {settings.CACHE_TTL_SECONDS}s (máx {settings.CACHE_MAX_MB} MB)")
     print(f"✓ Max image size: {settings.MAX_IMAGE_SIZE}px")
     print(f"✓ Image quality: {settings.IMAGE_QUALITY}%")
     print(f"✓ DB pool size: {settings.DB_POOL_SIZE}")
@@ -0,0 +1,35 @@
+# gunicorn.conf.py
+# ---------------------------------------------------------
+# Arranque en producción con varios workers:
+#   gunicorn app.main:app
+# (gunicorn lee este archivo por defecto desde el directorio actual)
+#
+# preload_app: la app y el modelo YOLO se cargan UNA vez en el proceso
+# maestro antes del fork. Los workers heredan torch/Ultralytics ya
+# importados y los pesos en memoria copy-on-write; la descarga y la
+# exportación ONNX/TensorRT tampoco se repiten por worker.
+# ---------------------------------------------------------
+import os
+
+# torch.cuda.is_available() sin crear el contexto CUDA en el maestro
+# (CUDA no sobrevive al fork: cada worker crea el suyo al predecir)
+os.environ.setdefault("PYTORCH_NVML_BASED_CUDA_CHECK", "1")
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+# La primera carga (descarga + exportación) puede tardar
+timeout = 120
+
+
+def when_ready(server):
+    """Maestro, antes de crear los workers: esquema de BD y modelo una sola vez"""
+    # Las migraciones corren aquí antes del fork: los workers solo ven el
+    # esquema ya al día (sin ALTER TABLE concurrentes en su startup)
+    from app.migrations import init_db
+    init_db()
+    # Solo carga (sin predict): el pool de hilos de torch se crea en cada
+    # worker, en el calentamiento del evento startup
+    from app.model_store import get_model
+    get_model()
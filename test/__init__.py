@@ -9,5 +9,6 @@ Estructura:
 - test_email_validator.py: Tests para validación de emails
 - test_image_validator.py: Tests para validación de imágenes
 - test_endpoints.py: Tests para endpoints de la API
+- test_cache.py: Tests para el caché de resultados
 - test_auth.py: Tests para autenticación y autorización
 """
\ No newline at end of file
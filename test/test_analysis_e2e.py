@@ -59,6 +59,35 @@ def crear_imagen_fallback():
 # FIXTURES
 # ═══════════════════════════════════════════════════════════════════
 
+@pytest.fixture(scope="module", autouse=True)
+def bd_temporal(tmp_path_factory):
+    """
+    SQLite temporal con el esquema de init_db: los usuarios y análisis
+    de prueba no se escriben en dental.db
+    """
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from app.dependencies import get_db
+    from app.migrations import init_db
+    
+    ruta = tmp_path_factory.mktemp("e2e") / "t.db"
+    engine = create_engine(f"sqlite:///{ruta}", connect_args={"check_same_thread": False})
+    init_db(engine)
+    Sesion = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    
+    def get_db_temporal():
+        db = Sesion()
+        try:
+            yield db
+        finally:
+            db.close()
+    
+    app.dependency_overrides[get_db] = get_db_temporal
+    yield Sesion
+    app.dependency_overrides.pop(get_db, None)
+    engine.dispose()
+
+
 @pytest.fixture(scope="module")
 def usuario_y_token():
     """
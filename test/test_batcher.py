@@ -0,0 +1,92 @@
+# test/test_batcher.py
+"""
+Tests de la cola de inferencia (app/batcher.py)
+Usan una función de lote falsa: no necesitan el modelo YOLO
+"""
+
+import asyncio
+from concurrent.futures import Future
+import sys
+from pathlib import Path
+
+import pytest
+
+# Agregar la carpeta raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.batcher import InferenceBatcher
+
+
+class LoteFalso:
+    """Registra cada llamada y devuelve (imagen, confianza) por imagen"""
+
+    def __init__(self, error=None):
+        self.llamadas = []
+        self.error = error
+
+    def __call__(self, images, confidences, copy=True):
+        self.llamadas.append((list(images), list(confidences)))
+        if self.error:
+            raise self.error
+        futures = []
+        for image, confidence in zip(images, confidences):
+            fut = Future()
+            fut.set_result((image, {"confidence": confidence}))
+            futures.append(fut)
+        return futures
+
+
+async def _enviar(batcher, items):
+    try:
+        return await asyncio.gather(
+            *(batcher.submit(img, conf) for img, conf in items),
+            return_exceptions=True,
+        )
+    finally:
+        await batcher.stop()
+
+
+class TestInferenceBatcher:
+    """Agrupación de peticiones concurrentes"""
+
+    @pytest.mark.unit
+    def test_peticiones_concurrentes_un_lote(self):
+        """Las peticiones que llegan juntas van en una sola llamada"""
+        lote = LoteFalso()
+        batcher = InferenceBatcher(lote, max_batch=8, window_ms=20)
+        
+        resultados = asyncio.run(_enviar(batcher, [(i, 0.25) for i in range(3)]))
+        
+        assert lote.llamadas == [([0, 1, 2], [0.25, 0.25, 0.25])]
+        assert [img for img, _ in resultados] == [0, 1, 2]
+
+    @pytest.mark.unit
+    def test_lote_limitado_por_max_batch(self):
+        """Nunca se pasan más de max_batch imágenes por llamada"""
+        lote = LoteFalso()
+        batcher = InferenceBatcher(lote, max_batch=2, window_ms=20)
+        
+        resultados = asyncio.run(_enviar(batcher, [(i, 0.25) for i in range(5)]))
+        
+        assert [len(imgs) for imgs, _ in lote.llamadas] == [2, 2, 1]
+        assert [img for img, _ in resultados] == [0, 1, 2, 3, 4]
+
+    @pytest.mark.unit
+    def test_confianzas_distintas_mismo_lote(self):
+        """Cada imagen lleva su confianza dentro del mismo lote"""
+        lote = LoteFalso()
+        batcher = InferenceBatcher(lote, max_batch=8, window_ms=20)
+        
+        resultados = asyncio.run(_enviar(batcher, [(0, 0.25), (1, 0.5), (2, 0.25)]))
+        
+        assert lote.llamadas == [([0, 1, 2], [0.25, 0.5, 0.25])]
+        assert [p["confidence"] for _, p in resultados] == [0.25, 0.5, 0.25]
+
+    @pytest.mark.unit
+    def test_error_llega_a_cada_peticion(self):
+        """Un fallo del lote se propaga a todas las peticiones del lote"""
+        batcher = InferenceBatcher(LoteFalso(RuntimeError("sin modelo")), window_ms=20)
+        
+        resultados = asyncio.run(_enviar(batcher, [(0, 0.25), (1, 0.25)]))
+        
+        assert all(isinstance(r, RuntimeError) for r in resultados)
@@ -0,0 +1,165 @@
+# test/test_cache.py
+"""
+Tests para el caché en memoria de resultados de análisis.
+
+Para ejecutar:
+    pytest test/test_cache.py -v -s
+"""
+
+import pytest
+import sys
+from pathlib import Path
+from PIL import Image
+import numpy as np
+
+# Agregar la carpeta raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app import models
+from app.cache import (
+    ResultCache, inference_cache_key, inference_cache_keys, load_inference,
+    store_inference,
+)
+from app.settings import settings
+
+
+# ═══════════════════════════════════════════════════════════════════
+# HELPERS
+# ═══════════════════════════════════════════════════════════════════
+
+def crear_imagen(seed=0, width=320, height=160):
+    """Crea imagen RGB aleatoria reproducible"""
+    rng = np.random.default_rng(seed)
+    arr = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    return Image.fromarray(arr, mode='RGB')
+
+
+@pytest.fixture
+def cache():
+    c = ResultCache()
+    c.enabled = True
+    return c
+
+
+# ═══════════════════════════════════════════════════════════════════
+# TESTS
+# ═══════════════════════════════════════════════════════════════════
+
+class TestResultCache:
+    """Tests del caché de resultados"""
+
+    @pytest.mark.unit
+    def test_clave_estable(self):
+        """La misma imagen produce la misma clave"""
+        assert inference_cache_key(crear_imagen(1), 0.25, "test") == \
+            inference_cache_key(crear_imagen(1), 0.25, "test")
+
+    @pytest.mark.unit
+    def test_clave_distingue_imagenes(self):
+        """Imágenes distintas (contenido, modo o tamaño) producen claves distintas"""
+        img = crear_imagen(1)
+        claves = {
+            inference_cache_key(i, 0.25, "test")
+            for i in (
+                img, crear_imagen(2), img.convert("L"),
+                crear_imagen(1, width=160, height=320),
+            )
+        }
+        assert len(claves) == 4
+
+    @pytest.mark.unit
+    def test_hit_y_miss(self, cache):
+        """Un resultado guardado se recupera; una clave nueva no"""
+        key = inference_cache_key(crear_imagen(3), 0.25, "test")
+        assert cache.lookup(key) is None
+
+        cache.store(key, {"summary": {"total": 0}})
+        assert cache.lookup(key) == {"summary": {"total": 0}}
+        assert cache.lookup(inference_cache_key(crear_imagen(4), 0.25, "test")) is None
+
+    @pytest.mark.unit
+    def test_tamano_acotado_en_bytes(self, monkeypatch):
+        """El caché nunca supera CACHE_MAX_MB de imagen anotada"""
+        monkeypatch.setattr(settings, "CACHE_MAX_MB", 1)
+        cache = ResultCache()
+        cache.enabled = True
+        img = crear_imagen(0)  # 320*160*3 = 150 KB: caben 6 en 1 MB
+        for i in range(10):
+            cache.store(f"k{i}", (img, {"i": i}))
+        assert len(cache.cache) == 6
+        assert cache.cache.currsize <= cache.max_bytes
+
+        # Una imagen mayor que todo el caché no se guarda (ni falla)
+        cache.store("grande", (crear_imagen(1, width=1024, height=1024), {}))
+        assert cache.lookup("grande") is None
+
+    @pytest.mark.unit
+    def test_lookup_many_conserva_orden(self, cache):
+        """lookup_many devuelve un resultado por clave, en el mismo orden"""
+        imgs = [crear_imagen(i) for i in range(4)]
+        keys = inference_cache_keys(imgs, [0.25] * 4, "test")
+        assert keys == [inference_cache_key(img, 0.25, "test") for img in imgs]
+        cache.store(keys[1], {"i": 1})
+        cache.store(keys[3], {"i": 3})
+        assert cache.lookup_many(keys) == [None, {"i": 1}, None, {"i": 3}]
+
+    @pytest.mark.unit
+    def test_lookup_con_clave_propia(self, cache):
+        """lookup/store usan la clave del llamador (imagen + confianza + modelo)"""
+        img = crear_imagen(9)
+        key = inference_cache_key(img, 0.25, "test")
+        cache.store(key, ("img", {"total": 1}))
+        assert cache.lookup(key) == ("img", {"total": 1})
+        assert cache.lookup(inference_cache_key(img, 0.5, "test")) is None
+
+
+class TestInferenceCache:
+    """Tests del caché persistente de inferencias (SQLite)"""
+
+    @pytest.fixture(autouse=True)
+    def bd_temporal(self, tmp_path, monkeypatch):
+        """SQLite temporal: los tests no tocan dental.db"""
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from app import cache
+        
+        engine = create_engine(f"sqlite:///{tmp_path / 't.db'}")
+        models.Base.metadata.create_all(bind=engine)
+        monkeypatch.setattr(cache, "SessionLocal", sessionmaker(bind=engine))
+        yield
+        engine.dispose()
+
+    @pytest.mark.unit
+    def test_clave_depende_de_confianza_y_modelo(self):
+        """La clave cambia con la confianza y con el modelo"""
+        img = crear_imagen(5)
+        base = inference_cache_key(img, 0.25, "best.pt:1")
+        assert base == inference_cache_key(crear_imagen(5), 0.25, "best.pt:1")
+        assert base != inference_cache_key(img, 0.5, "best.pt:1")
+        assert base != inference_cache_key(img, 0.25, "best.pt:2")
+
+    @pytest.mark.unit
+    def test_guardar_y_recuperar(self):
+        """El payload y la imagen anotada se recuperan sin pérdida"""
+        img = crear_imagen(6)
+        key = inference_cache_key(img, 0.25, "test")
+        payload = {"summary": {"total": 1, "per_class": {"Caries": 1}}, "detections": []}
+        
+        store_inference(key, img, payload)
+        img_cached, payload_cached = load_inference(key)
+        
+        assert payload_cached == payload
+        assert np.array_equal(np.asarray(img_cached), np.asarray(img))
+        assert load_inference("no-existe") is None
+
+    @pytest.mark.unit
+    def test_limite_de_entradas(self, monkeypatch):
+        """Sobre el límite se desalojan las entradas más antiguas"""
+        monkeypatch.setattr(settings, "INFERENCE_CACHE_MAX_ENTRIES", 2)
+        
+        keys = [f"limite-{i}" for i in range(3)]
+        for key in keys:
+            store_inference(key, crear_imagen(7, 16, 16), {"n": key})
+        
+        assert load_inference(keys[0]) is None
+        assert load_inference(keys[2]) is not None
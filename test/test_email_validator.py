@@ -21,6 +21,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 # Importar desde app/image_validator.py
 from app.image_validator import validate_dental_xray, validate_is_xray
+from app.email_validator import validate_email
 
 # Importar configuración del dataset
 try:
@@ -356,4 +357,48 @@ class TestValidadorEstadisticas:
         print(f"  - Panorámica: {avg_pano:.2f}")
         
         # El test pasa si genera las estadísticas
-        assert True
\ No newline at end of file
+        assert True
+
+
+class TestEmailValidator:
+    """Tests para el validador de correos"""
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("email", [
+        "usuario@gmail.com",
+        "user.name@example.co.uk",
+        "user_name@domain.com",
+        "user-name@domain.com",
+        "doctor123@hospital.com",
+        "  Usuario@Gmail.COM  ",
+    ])
+    def test_correos_validos(self, email):
+        """Correos bien formados deben ser aceptados"""
+        is_valid, error = validate_email(email)
+        assert is_valid, error
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("email,fragmento", [
+        ("", "requerido"),
+        ("user", "@"),
+        ("ab@gmail.com", "3 caracteres"),
+        ("us$er@gmail.com", "no permitidos"),
+        ("user\n@gmail.com", "no permitidos"),
+        ("1.2..3@gmail.com", "consecutivos"),
+        (".user@gmail.com", "punto"),
+        ("user..name@gmail.com", "consecutivos"),
+        ("123@gmail.com", "solo números"),
+        ("a12@gmail.com", "2 letras"),
+        ("user@domain", "extensión"),
+        ("user@domain..com", "consecutivos"),
+        ("user@.domain.com", "punto"),
+        ("user@dom_ain.com", "no permitidos"),
+        ("user@-domain.com", "guion"),
+        ("user@domain.c0m", "extensión"),
+        ("user@domain.c", "extensión"),
+    ])
+    def test_correos_invalidos(self, email, fragmento):
+        """Correos mal formados deben ser rechazados con el motivo correcto"""
+        is_valid, error = validate_email(email)
+        assert not is_valid
+        assert fragmento in error
@@ -16,6 +16,8 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 # Importar la app desde app/main.py
 from app.main import app
+from app.auth import create_access_token
+from app.settings import settings
 
 # Cliente de prueba para FastAPI
 client = TestClient(app)
@@ -77,6 +79,52 @@ class TestAuthEndpoints:
         response = client.post("/auth/login", json=payload)
         assert response.status_code in [401, 422]
 
+    @pytest.mark.api
+    def test_me_token_invalido(self):
+        """/auth/me con token inválido debe retornar 401"""
+        headers = {"Authorization": "Bearer token-invalido"}
+        response = client.get("/auth/me", headers=headers)
+        assert response.status_code == 401
+
+    @pytest.mark.api
+    def test_me_token_con_email_en_sub(self):
+        """Tokens antiguos (sub = email) deben retornar 401"""
+        token = create_access_token({"sub": "test@example.com"})
+        headers = {"Authorization": f"Bearer {token}"}
+        response = client.get("/auth/me", headers=headers)
+        assert response.status_code == 401
+
+    @pytest.mark.api
+    def test_logout_sin_token(self):
+        """Logout sin token debe retornar 401"""
+        response = client.post("/auth/logout")
+        assert response.status_code == 401
+
+    @pytest.mark.api
+    def test_logout_revoca_token(self, bd_temporal):
+        """Tras logout el token se rechaza; un login nuevo sigue funcionando"""
+        import uuid
+        datos = {"email": f"logout_{uuid.uuid4().hex[:8]}@gmail.com", "password": "password123"}
+        token = client.post("/auth/register", json=datos).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        assert client.get("/auth/me", headers=headers).status_code == 200
+
+        assert client.post("/auth/logout", headers=headers).status_code == 200
+        assert client.get("/auth/me", headers=headers).status_code == 401
+
+        login = client.post(
+            "/auth/login", data={"username": datos["email"], "password": datos["password"]}
+        )
+        nuevo = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        assert client.get("/auth/me", headers=nuevo).status_code == 200
+
+    @pytest.mark.api
+    @pytest.mark.skipif(settings.DEBUG, reason="DEBUG=true monta los endpoints de diagnóstico")
+    def test_performance_test_oculto_sin_debug(self):
+        """/auth/performance-test no debe existir fuera de DEBUG"""
+        response = client.get("/auth/performance-test")
+        assert response.status_code == 404
+
 
 class TestAnalyzeEndpoint:
     """Tests para el endpoint de análisis de radiografías"""
@@ -117,6 +165,221 @@ class TestAnalyzeEndpoint:
         response = client.post("/analyze", files=files)
         assert response.status_code in [401, 403, 422]
 
+    @pytest.mark.api
+    def test_analyze_batch_demasiadas_imagenes(self):
+        """Lotes por encima de MAX_BATCH_SIZE se rechazan antes de validar"""
+        files = [
+            ("files", (f"img{i}.jpg", self.crear_imagen_test(), "image/jpeg"))
+            for i in range(settings.MAX_BATCH_SIZE + 1)
+        ]
+        response = client.post("/analyze-public-batch", files=files)
+        assert response.status_code == 400
+        assert "Máximo" in response.json()["detail"]
+
+    @pytest.mark.api
+    def test_analyze_batch_imagen_invalida(self):
+        """Una imagen inválida rechaza el lote indicando el archivo"""
+        files = [
+            ("files", ("foto.jpg", self.crear_imagen_test(color=True), "image/jpeg")),
+        ]
+        response = client.post("/analyze-public-batch", files=files)
+        assert response.status_code == 400
+        assert response.json()["detail"].startswith("foto.jpg:")
+
+    @pytest.mark.api
+    def test_archivo_demasiado_grande(self, monkeypatch):
+        """Archivos por encima de MAX_UPLOAD_BYTES se rechazan con 413"""
+        monkeypatch.setattr(settings, "MAX_UPLOAD_BYTES", 1024)
+        files = {"file": ("grande.jpg", self.crear_imagen_test(), "image/jpeg")}
+        response = client.post("/analyze-public", files=files)
+        assert response.status_code == 413
+        assert response.json()["detail"].startswith("grande.jpg:")
+
+
+    @pytest.mark.api
+    def test_inferencia_fuera_del_event_loop(self, monkeypatch):
+        """YOLO corre en el threadpool, no en el hilo del event loop"""
+        import asyncio
+        from app import router as router_module
+        
+        hilos = []
+        
+        def inferencia_falsa(img, confidence, copy=True):
+            try:
+                asyncio.get_running_loop()
+                hilos.append("event loop")
+            except RuntimeError:
+                hilos.append("threadpool")
+            return img, {
+                "summary": {"total": 0, "per_class": {}},
+                "detections": [],
+                "stats": {},
+                "report_text": "",
+            }
+        
+        monkeypatch.setattr(router_module, "run_inference", inferencia_falsa)
+        monkeypatch.setattr(settings, "ENABLE_INFERENCE_BATCHER", False)
+        ruta = Path(__file__).parent / "test_images" / "radiografia_normal.jpg"
+        with open(ruta, "rb") as f:
+            files = {"file": ("radiografia_normal.jpg", f, "image/jpeg")}
+            response = client.post("/analyze-public", files=files)
+        
+        assert response.status_code == 200
+        assert hilos == ["threadpool"]
+
+    @pytest.mark.api
+    def test_analyze_url_descarga_asincrona(self, monkeypatch):
+        """/analyze-url descarga con httpx (sin red: transporte simulado)"""
+        import httpx
+        from app import image_io, router as router_module
+        
+        imagen = self.crear_imagen_test().getvalue()
+        transporte = httpx.MockTransport(lambda request: httpx.Response(200, content=imagen))
+        monkeypatch.setattr(
+            image_io, "_get_http_client", lambda: httpx.AsyncClient(transport=transporte)
+        )
+        
+        recibidas = []
+        
+        def inferencia_falsa(img, confidence, copy=True):
+            recibidas.append(img.size)
+            return img, {
+                "summary": {"total": 0, "per_class": {}},
+                "detections": [],
+                "stats": {},
+                "report_text": "",
+            }
+        
+        monkeypatch.setattr(router_module, "run_inference", inferencia_falsa)
+        monkeypatch.setattr(settings, "ENABLE_INFERENCE_BATCHER", False)
+        response = client.post("/analyze-url", json={"url": "http://imagenes.test/rx.jpg"})
+        assert response.status_code == 200
+        assert recibidas == [(800, 400)]
+        
+        monkeypatch.setattr(settings, "MAX_UPLOAD_BYTES", 1024)
+        response = client.post("/analyze-url", json={"url": "http://imagenes.test/rx.jpg"})
+        assert response.status_code == 413
+
+    @pytest.mark.api
+    def test_limite_de_inferencias_simultaneas(self, monkeypatch):
+        """MAX_CONCURRENT_INFERENCE acota los análisis en el threadpool"""
+        import asyncio
+        import threading
+        import time
+        from app import router as router_module
+        
+        activos, maximo = [0], [0]
+        lock = threading.Lock()
+        
+        def analisis_falso(img, file_bytes, confidence, return_image):
+            with lock:
+                activos[0] += 1
+                maximo[0] = max(maximo[0], activos[0])
+            time.sleep(0.05)
+            with lock:
+                activos[0] -= 1
+            return {}
+        
+        monkeypatch.setattr(router_module, "_analyze_image", analisis_falso)
+        monkeypatch.setattr(settings, "ENABLE_INFERENCE_BATCHER", False)
+        monkeypatch.setattr(settings, "MAX_CONCURRENT_INFERENCE", 2)
+        
+        async def lanzar():
+            await asyncio.gather(*(
+                router_module._run_analysis(None, b"", 0.25, False) for _ in range(6)
+            ))
+        
+        asyncio.run(lanzar())
+        assert maximo[0] == 2
+
+    @pytest.mark.api
+    def test_imagen_guardada_fuera_de_la_fila(self, monkeypatch, tmp_path, bd_temporal):
+        """save=true escribe la imagen en IMAGE_DIR y la fila solo guarda la clave"""
+        import uuid
+        from app import router as router_module
+        
+        def inferencia_falsa(img, confidence, copy=True):
+            return img, {
+                "summary": {"total": 0, "per_class": {}},
+                "detections": [],
+                "stats": {},
+                "report_text": "",
+            }
+        
+        monkeypatch.setattr(router_module, "run_inference", inferencia_falsa)
+        monkeypatch.setattr(settings, "ENABLE_INFERENCE_BATCHER", False)
+        monkeypatch.setattr(settings, "IMAGE_DIR", str(tmp_path))
+        
+        registro = client.post("/auth/register", json={
+            "email": f"imagenes_{uuid.uuid4().hex[:8]}@gmail.com",
+            "password": "password123",
+        })
+        headers = {"Authorization": f"Bearer {registro.json()['access_token']}"}
+        
+        ruta = Path(__file__).parent / "test_images" / "radiografia_normal.jpg"
+        with open(ruta, "rb") as f:
+            files = {"file": ("radiografia_normal.jpg", f, "image/jpeg")}
+            data = {"save": "true", "return_image": "true"}
+            response = client.post("/analyze", files=files, data=data, headers=headers)
+        assert response.status_code == 200
+        
+        (item,) = client.get("/analyses", headers=headers).json()
+        assert item["per_user_index"] == 1
+        assert "image_base64" not in item
+        assert client.get("/analyses?offset=1", headers=headers).json() == []
+        archivos = list(tmp_path.rglob("*.jpg"))
+        assert len(archivos) == 1
+        
+        from app import models
+        with bd_temporal() as db:
+            guardado = db.get(models.Analysis, item["analysis_id"])
+            assert "image_base64" not in guardado.results_json
+        
+        imagen = client.get(item["image_url"], headers=headers)
+        assert imagen.status_code == 200
+        assert imagen.headers["content-type"] == "image/jpeg"
+        assert imagen.content == archivos[0].read_bytes()
+        
+        client.delete(f"/analyses/{item['analysis_id']}", headers=headers)
+        assert not archivos[0].exists()
+
+    @pytest.mark.api
+    def test_commit_fallido_no_deja_imagen(self, monkeypatch, tmp_path, bd_temporal):
+        """Si el commit falla, la imagen ya escrita en disco se borra"""
+        import uuid
+        from sqlalchemy.orm import Session
+        from app import models
+        from app import router as router_module
+        
+        monkeypatch.setattr(
+            router_module, "run_inference",
+            lambda img, confidence, copy=True: (img, {
+                "summary": {"total": 0, "per_class": {}},
+                "detections": [], "stats": {}, "report_text": "",
+            }),
+        )
+        monkeypatch.setattr(settings, "ENABLE_INFERENCE_BATCHER", False)
+        monkeypatch.setattr(settings, "IMAGE_DIR", str(tmp_path))
+        
+        registro = client.post("/auth/register", json={
+            "email": f"fallo_{uuid.uuid4().hex[:8]}@gmail.com",
+            "password": "password123",
+        })
+        headers = {"Authorization": f"Bearer {registro.json()['access_token']}"}
+        
+        def commit_fallido(self):
+            raise RuntimeError("disco lleno")
+        monkeypatch.setattr(Session, "commit", commit_fallido)
+        
+        ruta = Path(__file__).parent / "test_images" / "radiografia_normal.jpg"
+        with open(ruta, "rb") as f, pytest.raises(RuntimeError):
+            files = {"file": ("radiografia_normal.jpg", f, "image/jpeg")}
+            data = {"save": "true", "return_image": "true"}
+            client.post("/analyze", files=files, data=data, headers=headers)
+        
+        assert list(tmp_path.rglob("*.jpg")) == []
+        with bd_temporal() as db:
+            assert db.query(models.Analysis).count() == 0
 
 class TestCORSHeaders:
     """Tests para configuración de CORS"""
@@ -132,6 +395,33 @@ class TestCORSHeaders:
 # Fixtures (datos compartidos entre tests)
 # ═══════════════════════════════════════════════════════════
 
+@pytest.fixture
+def bd_temporal(tmp_path):
+    """BD SQLite temporal para los endpoints (no toca dental.db)"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from app import models
+    from app.dependencies import get_db
+    
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 't.db'}", connect_args={"check_same_thread": False}
+    )
+    models.Base.metadata.create_all(bind=engine)
+    Sesion = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    
+    def get_db_temporal():
+        db = Sesion()
+        try:
+            yield db
+        finally:
+            db.close()
+    
+    app.dependency_overrides[get_db] = get_db_temporal
+    yield Sesion
+    app.dependency_overrides.pop(get_db, None)
+    engine.dispose()
+
+
 @pytest.fixture
 def imagen_radiografia_test():
     """Fixture que crea una imagen de radiografía de prueba"""
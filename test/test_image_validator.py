@@ -17,6 +17,7 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 # Importar validador
+from app import image_validator as iv
 from app.image_validator import validate_dental_xray, validate_is_xray
 
 # Importar configuración del dataset
@@ -166,6 +167,72 @@ class TestImageValidator:
         assert "contraste" in msg.lower()
         print(f"\n✅ Sin contraste rechazada")
 
+    @pytest.mark.unit
+    def test_imagen_grande_mismo_resultado(self):
+        """Una imagen grande (submuestreada) da el mismo veredicto que a tamaño normal"""
+        img = crear_imagen_color(800, 600)
+        grande = img.resize((4000, 3000), Image.NEAREST)
+        assert validate_is_xray(grande)[0] == validate_is_xray(img)[0] == False
+        print(f"\n✅ Imagen grande evaluada igual")
+
+    @pytest.mark.unit
+    def test_imagen_demasiado_grande_rechazada(self):
+        """Imágenes de más de 10000px se rechazan por tamaño"""
+        buffer = io.BytesIO()
+        Image.new('L', (12000, 100)).save(buffer, format='PNG')
+        is_valid, msg, _ = validate_dental_xray(buffer.getvalue(), "enorme.png")
+        
+        assert is_valid == False
+        assert "demasiado grande" in msg
+        print(f"\n✅ Imagen enorme rechazada")
+
+    @pytest.mark.unit
+    def test_validacion_cacheada_por_contenido(self):
+        """El mismo archivo se valida una vez; la extensión sigue contando"""
+        buffer = io.BytesIO()
+        crear_imagen_color(200, 100).save(buffer, format='PNG')
+        data = buffer.getvalue()
+        
+        primero = validate_dental_xray(data, "foto.png")
+        primero[2]["is_xray"] = "modificado"
+        segundo = validate_dental_xray(data, "foto.png")
+        
+        assert segundo[:2] == primero[:2]
+        assert segundo[2]["is_xray"] == False
+        assert validate_dental_xray(data, "foto.pdf")[1] != primero[1]
+        print(f"\n✅ Validación cacheada")
+
+    @pytest.mark.unit
+    def test_imagen_decodificada_reutilizable(self):
+        """validate_and_load_xray entrega la imagen RGB de una radiografía válida"""
+        buffer = io.BytesIO()
+        arr = np.random.randint(0, 256, (500, 1200), dtype=np.uint8)
+        Image.fromarray(arr, mode='L').convert('RGB').save(buffer, format='PNG')
+        data = buffer.getvalue()
+        
+        is_valid, _, _, img = iv.validate_and_load_xray(data, "nueva.png")
+        assert is_valid == True
+        assert img.mode == "RGB" and img.size == (1200, 500)
+        # Segunda vez: veredicto desde la caché, sin imagen
+        assert iv.validate_and_load_xray(data, "nueva.png")[3] is None
+        print(f"\n✅ Imagen decodificada reutilizable")
+
+    @pytest.mark.unit
+    def test_umbrales_configurados(self):
+        """Los umbrales de la heurística tienen los valores acordados"""
+        assert iv.STRONG_COLOR_THRESHOLD == 0.35
+        assert iv.MEDIUM_COLOR_THRESHOLD == 0.20
+        assert iv.MEAN_SAT_LIMIT == 0.10
+        assert iv.STRONG_RATIO_LIMIT == 0.10
+        assert (iv.MEDIUM_MEAN_SAT_LIMIT, iv.MEDIUM_RATIO_LIMIT) == (0.05, 0.40)
+        assert iv.MEDIUM_RATIO_MAX == 0.45
+        assert iv.MIN_GRAY_STD == 12
+        assert (iv.DARK_LEVEL, iv.BRIGHT_LEVEL) == (50, 200)
+        assert iv.PANORAMIC_ASPECT_RANGE == (1.4, 4.0)
+        assert iv.MAX_IMAGE_SIDE == 10000
+        # Equivalentes enteros sobre S en [0, 255]
+        assert (iv._S_STRONG_MIN, iv._S_MEDIUM_MIN) == (90, 52)
+
 
 # ═══════════════════════════════════════════════════════════════════
 # TESTS DE FORMATOS
@@ -0,0 +1,78 @@
+# test/test_migrations.py
+"""
+Tests del esquema de BD (app/migrations.py)
+Corren sobre un SQLite temporal: no tocan dental.db
+"""
+
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+# Agregar la carpeta raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.migrations import init_db
+
+ROOT = Path(__file__).parent.parent
+
+
+@pytest.fixture
+def bd_antigua(tmp_path):
+    """BD con el esquema anterior (sin image_key ni analysis_counter)"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'antigua.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR(255), "
+            "password_hash VARCHAR(255), name VARCHAR(255), is_active BOOLEAN, "
+            "created_at DATETIME)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE analyses (id INTEGER PRIMARY KEY, per_user_index INTEGER, "
+            "user_id INTEGER NOT NULL, created_at DATETIME)"
+        ))
+        conn.execute(text("INSERT INTO users (id, email) VALUES (1, 'a@x.com'), (2, 'b@x.com')"))
+        conn.execute(text(
+            "INSERT INTO analyses (per_user_index, user_id) VALUES (1, 1), (3, 1)"
+        ))
+    yield engine
+    engine.dispose()
+
+
+class TestInitDb:
+    """Columnas, backfill e índices nuevos sobre una BD existente"""
+
+    @pytest.mark.unit
+    def test_agrega_columnas_y_completa_contador(self, bd_antigua):
+        init_db(bd_antigua)
+        # Idempotente: una segunda pasada no falla ni repite el ALTER
+        init_db(bd_antigua)
+
+        columnas = {c["name"] for c in inspect(bd_antigua).get_columns("analyses")}
+        assert "image_key" in columnas
+        indices = {i["name"] for i in inspect(bd_antigua).get_indexes("analyses")}
+        assert "ix_analyses_user_created" in indices
+        with bd_antigua.connect() as conn:
+            contadores = dict(conn.execute(
+                text("SELECT id, analysis_counter FROM users")
+            ).all())
+        assert contadores == {1: 3, 2: 0}
+
+    @pytest.mark.unit
+    def test_importar_app_no_migra(self):
+        """Importar app.main no ejecuta DDL: solo el evento startup lo hace"""
+        codigo = (
+            "from sqlalchemy import event\n"
+            "from app.database import engine\n"
+            "sql = []\n"
+            "event.listen(engine, 'before_cursor_execute', lambda *a: sql.append(a[2]))\n"
+            "import app.main\n"
+            "print('SENTENCIAS=%d' % len(sql))\n"
+        )
+        salida = subprocess.run(
+            [sys.executable, "-c", codigo], cwd=ROOT,
+            capture_output=True, text=True, timeout=120,
+        )
+        assert "SENTENCIAS=0" in salida.stdout, salida.stderr
@@ -0,0 +1,230 @@
+# test/test_model_store.py
+"""
+Tests de la descarga del modelo (app/model_store.py)
+Usan respuestas HTTP falsas: no necesitan red ni el modelo YOLO
+"""
+
+import hashlib
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# Agregar la carpeta raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app import model_store
+from app.settings import settings
+
+
+class RespuestaFalsa:
+    """Respuesta mínima de requests.get(stream=True)"""
+
+    def __init__(self, status_code, body=b"", headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = dict(headers or {})
+        if body:
+            self.headers.setdefault("Content-Length", str(len(body)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise IOError(f"HTTP {self.status_code}")
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.body), chunk_size):
+            yield self.body[i:i + chunk_size]
+
+
+@pytest.fixture
+def servidor(monkeypatch):
+    """Cola de respuestas y registro de los headers enviados"""
+    estado = {"respuestas": [], "headers": []}
+
+    def get_falso(url, headers=None, **kwargs):
+        estado["headers"].append(dict(headers or {}))
+        return estado["respuestas"].pop(0)
+
+    monkeypatch.setattr(model_store.requests, "get", get_falso)
+    monkeypatch.setattr(settings, "MODEL_SHA256", None)
+    return estado
+
+
+class TestDescargaModelo:
+    """Descarga reanudable y revalidación por ETag"""
+
+    @pytest.mark.unit
+    def test_descarga_guarda_etag(self, servidor, tmp_path):
+        dest = str(tmp_path / "best.pt")
+        servidor["respuestas"].append(RespuestaFalsa(200, b"pesos", {"ETag": '"v1"'}))
+
+        assert model_store._stream_download("http://x/best.pt", dest)
+
+        assert Path(dest).read_bytes() == b"pesos"
+        assert Path(dest + ".etag").read_text() == '"v1"'
+        assert not Path(dest + ".part").exists()
+
+    @pytest.mark.unit
+    def test_reanuda_descarga_parcial(self, servidor, tmp_path, monkeypatch):
+        dest = str(tmp_path / "best.pt")
+        Path(dest + ".part").write_bytes(b"pesos ")
+        Path(dest + ".part.etag").write_text('"v1"')
+        monkeypatch.setattr(
+            settings, "MODEL_SHA256", hashlib.sha256(b"pesos completos").hexdigest()
+        )
+        servidor["respuestas"].append(RespuestaFalsa(206, b"completos", {"ETag": '"v1"'}))
+
+        model_store._stream_download("http://x/best.pt", dest)
+
+        assert servidor["headers"][0]["Range"] == "bytes=6-"
+        assert servidor["headers"][0]["If-Range"] == '"v1"'
+        assert Path(dest).read_bytes() == b"pesos completos"
+
+    @pytest.mark.unit
+    def test_parcial_desactualizado_empieza_de_cero(self, servidor, tmp_path):
+        dest = str(tmp_path / "best.pt")
+        Path(dest + ".part").write_bytes(b"viejo")
+        Path(dest + ".part.etag").write_text('"v1"')
+        servidor["respuestas"].append(RespuestaFalsa(200, b"nuevo", {"ETag": '"v2"'}))
+
+        model_store._stream_download("http://x/best.pt", dest)
+
+        assert Path(dest).read_bytes() == b"nuevo"
+        assert Path(dest + ".etag").read_text() == '"v2"'
+
+    @pytest.mark.unit
+    def test_corte_conserva_parcial_para_reanudar(self, servidor, tmp_path):
+        dest = str(tmp_path / "best.pt")
+        cortada = RespuestaFalsa(200, b"pes", {"ETag": '"v1"', "Content-Length": "5"})
+        servidor["respuestas"].append(cortada)
+
+        with pytest.raises(IOError):
+            model_store._stream_download("http://x/best.pt", dest)
+
+        assert not Path(dest).exists()
+        assert Path(dest + ".part").read_bytes() == b"pes"
+
+    @pytest.mark.unit
+    def test_revalidacion_sin_cambios(self, servidor, tmp_path):
+        dest = str(tmp_path / "best.pt")
+        Path(dest).write_bytes(b"pesos")
+        servidor["respuestas"].append(RespuestaFalsa(304))
+
+        assert not model_store._stream_download("http://x/best.pt", dest, etag='"v1"')
+
+        assert servidor["headers"][0]["If-None-Match"] == '"v1"'
+        assert Path(dest).read_bytes() == b"pesos"
+
+    @pytest.mark.unit
+    def test_modelo_danado_se_vuelve_a_descargar(self, servidor, tmp_path, monkeypatch):
+        dest = str(tmp_path / "best.pt")
+        monkeypatch.setattr(settings, "MODEL_URL", "http://x/best.pt")
+        monkeypatch.setattr(settings, "MODEL_LOCAL_PATH", dest)
+        monkeypatch.setattr(model_store, "_model_path", model_store._model_path)
+        servidor["respuestas"].append(RespuestaFalsa(200, b"pesos", {"ETag": '"v1"'}))
+        model_store._download_model_if_needed()
+        assert Path(dest + ".sha256").read_text() == hashlib.sha256(b"pesos").hexdigest()
+
+        # Intacto: no se vuelve a pedir
+        model_store._download_model_if_needed()
+        assert len(servidor["headers"]) == 1
+
+        Path(dest).write_bytes(b"pes\x00s")
+        servidor["respuestas"].append(RespuestaFalsa(200, b"pesos", {"ETag": '"v1"'}))
+        model_store._download_model_if_needed()
+
+        assert len(servidor["headers"]) == 2
+        assert Path(dest).read_bytes() == b"pesos"
+
+    @pytest.mark.unit
+    def test_sha256_configurado_prevalece_sobre_el_guardado(
+        self, servidor, tmp_path, monkeypatch
+    ):
+        dest = str(tmp_path / "best.pt")
+        monkeypatch.setattr(settings, "MODEL_URL", "http://x/best.pt")
+        monkeypatch.setattr(settings, "MODEL_LOCAL_PATH", dest)
+        monkeypatch.setattr(model_store, "_model_path", model_store._model_path)
+        monkeypatch.setattr(settings, "MODEL_SHA256", hashlib.sha256(b"pesos").hexdigest())
+        # .pt reemplazado junto con un .sha256 que lo "valida"
+        Path(dest).write_bytes(b"otros")
+        Path(dest + ".sha256").write_text(hashlib.sha256(b"otros").hexdigest())
+        servidor["respuestas"].append(RespuestaFalsa(200, b"pesos", {"ETag": '"v1"'}))
+
+        model_store._download_model_if_needed()
+
+        assert len(servidor["headers"]) == 1
+        assert Path(dest).read_bytes() == b"pesos"
+
+
+class TestExportacion:
+    """Reutilización del modelo exportado junto al .pt"""
+
+    @pytest.fixture
+    def exportador(self, monkeypatch, tmp_path):
+        pt = tmp_path / "best.pt"
+        pt.write_bytes(b"pesos")
+        exportaciones = []
+
+        class YOLOFalso:
+            def __init__(self, path, task=None):
+                self.path = path
+
+            def export(self, format, **kwargs):
+                destino = str(pt.with_suffix(".onnx"))
+                Path(destino).write_bytes(b"onnx")
+                exportaciones.append(format)
+                return destino
+
+        monkeypatch.setattr(settings, "MODEL_BACKEND", "onnx")
+        monkeypatch.setattr(model_store, "_model_path", str(pt))
+        monkeypatch.setattr(model_store, "_yolo_class", lambda: YOLOFalso)
+        model_store._backend.cache_clear()
+        yield pt, exportaciones
+        model_store._backend.cache_clear()
+
+    @pytest.mark.unit
+    def test_exporta_una_sola_vez(self, exportador):
+        pt, exportaciones = exportador
+
+        primero = model_store._exported_model_path()
+        segundo = model_store._exported_model_path()
+
+        assert primero == segundo == str(pt.with_suffix(".onnx"))
+        assert exportaciones == ["onnx"]
+
+    @pytest.mark.unit
+    def test_reexporta_si_el_pt_es_mas_nuevo(self, exportador):
+        pt, exportaciones = exportador
+        model_store._exported_model_path()
+        onnx = pt.with_suffix(".onnx")
+        os.utime(onnx, (1, 1))  # exportado antes que el .pt actual
+
+        model_store._exported_model_path()
+
+        assert exportaciones == ["onnx", "onnx"]
+
+
+class TestImportacion:
+    """Arranque de la app sin cargar las librerías del modelo"""
+
+    @pytest.mark.unit
+    def test_importar_app_no_carga_ultralytics(self):
+        # Proceso aparte: en este ya se importaron torch/ultralytics
+        import subprocess
+        codigo = (
+            "import sys, app.main; "
+            "print('CARGADOS=' + ','.join(m for m in ('ultralytics', 'torch') if m in sys.modules))"
+        )
+        salida = subprocess.run(
+            [sys.executable, "-c", codigo],
+            cwd=Path(__file__).parent.parent,
+            capture_output=True, text=True, check=True,
+        )
+        assert "CARGADOS=\n" in salida.stdout
@@ -18,7 +18,10 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 # Importar módulo de inferencia
 try:
-    from app.inference import run_inference, calculate_fdi
+    from app.inference import (
+        run_inference, run_inference_batch, calculate_fdi, calculate_fdi_vec,
+        _predict_input,
+    )
     YOLO_DISPONIBLE = True
 except ImportError as e:
     print(f"❌ Error importando inference: {e}")
@@ -123,6 +126,37 @@ class TestYOLOInference:
         
         print(f"\n✅ Estructura correcta")
 
+    @skip_if_no_yolo
+    @pytest.mark.slow
+    def test_inferencia_batch(self, imagen_sintetica):
+        """El lote devuelve un resultado por imagen, igual al individual"""
+        otra = imagen_sintetica.transpose(Image.FLIP_LEFT_RIGHT)
+        lote = run_inference_batch([imagen_sintetica, otra], confidence=0.25)
+        
+        assert len(lote) == 2
+        _, individual = run_inference(imagen_sintetica, confidence=0.25)
+        assert lote[0][1]["summary"] == individual["summary"]
+        assert isinstance(lote[1][0], Image.Image)
+        print(f"\n✅ Inferencia por lotes OK")
+
+    @skip_if_no_yolo
+    @pytest.mark.unit
+    def test_reduccion_previa_a_predict(self, imagen_sintetica):
+        """Las imágenes grandes se reducen a MODEL_IMGSZ; las pequeñas no"""
+        from app.settings import settings
+        
+        reducida, (sx, sy), _ = _predict_input(imagen_sintetica)
+        assert max(reducida.size) == settings.MODEL_IMGSZ
+        assert reducida.size[0] * sx == pytest.approx(imagen_sintetica.width)
+        assert reducida.size[1] * sy == pytest.approx(imagen_sintetica.height)
+        
+        # Sin reducir: YOLO recibe BGR y el dibujo reutiliza el array RGB
+        pequena = imagen_sintetica.resize((320, 160))
+        bgr, escala, lienzo = _predict_input(pequena)
+        assert escala == (1.0, 1.0)
+        assert np.array_equal(lienzo, np.asarray(pequena))
+        assert np.array_equal(bgr, lienzo[..., ::-1])
+
     @skip_if_no_yolo
     @skip_if_no_dataset
     @pytest.mark.slow
@@ -203,6 +237,15 @@ class TestCalculateFDI:
         assert q_obtenido == q_esperado
         assert 11 <= fdi <= 48
 
+    @skip_if_no_yolo
+    @pytest.mark.unit
+    def test_fdi_vectorizado_igual_a_escalar(self):
+        """calculate_fdi_vec coincide con calculate_fdi punto a punto"""
+        x = np.linspace(0, 1, 101)
+        y = x[::-1]
+        esperado = [calculate_fdi(a, b) for a, b in zip(x.tolist(), y.tolist())]
+        assert calculate_fdi_vec(x, y).tolist() == esperado
+
 
 # ═══════════════════════════════════════════════════════════════════
 # TESTS DEL MODELO
@@ -220,6 +263,48 @@ class TestYOLOModelo:
         assert modelo is not None
         print(f"\n✅ Modelo cargado")
 
+    @skip_if_no_yolo
+    @pytest.mark.slow
+    def test_calentamiento(self):
+        """warmup deja el modelo cargado y con el predictor armado"""
+        from app.model_store import get_model, warmup
+        
+        modelo = warmup()
+        assert modelo is get_model()
+        assert modelo.predictor is not None
+
+    @pytest.mark.unit
+    def test_carga_concurrente_una_sola_vez(self, monkeypatch):
+        """Peticiones simultáneas en frío construyen el modelo una sola vez"""
+        import threading
+        from app import model_store
+        
+        construidos = []
+        
+        class YOLOFalso:
+            def __init__(self, path, task=None):
+                time.sleep(0.05)
+                construidos.append(path)
+        
+        monkeypatch.setattr(model_store, "_model", None)
+        monkeypatch.setattr(model_store, "_model_tag", None)
+        monkeypatch.setattr(model_store, "_yolo_class", lambda: YOLOFalso)
+        monkeypatch.setattr(model_store, "_download_model_if_needed", lambda: None)
+        monkeypatch.setattr(model_store, "_exported_model_path", lambda: "falso.pt")
+        
+        modelos = []
+        hilos = [
+            threading.Thread(target=lambda: modelos.append(model_store.get_model()))
+            for _ in range(4)
+        ]
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+        
+        assert construidos == ["falso.pt"]
+        assert all(m is modelos[0] for m in modelos)
+
     @skip_if_no_yolo
     @pytest.mark.unit
     def test_clases_correctas(self):